@@ -0,0 +1,287 @@
+# Description: Scores a folder of resumes against the JD embeddings as a streaming, resumable batch job.
+# Resumes flow through read -> extract -> embed -> score stages in batches. The stages are generators running on
+# their own threads, connected by bounded queues, so reading/OCR overlaps with BERT and memory stays bounded by the
+# queue sizes rather than the folder size. Results are appended to a CSV file or a directory of Parquet parts, and
+# every file whose result is on disk is recorded in a checkpoint, so an interrupted run picks up where it stopped.
+# Near-duplicates of a resume already scored in the run reuse its scores instead of being embedded again.
+# Usage: python batch_scorer.py --output output/resume_scores.csv
+import argparse
+import csv
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+
+from constants import RESUME_PATH, JD_PATH, JD_EMBEDDINGS_FILENAME, OUTPUT_PATH, INGEST_WORKERS, INGEST_CHUNK_SIZE, \
+    OCR_DPI, OCR_WORKERS, PDF_BACKENDS, PDF_TIMEOUT_SECONDS, PDF_MAX_PAGES, BATCH_SCORING_BATCH_SIZE, \
+    BATCH_SCORING_QUEUE_SIZE, BATCH_SCORING_FLUSH_ROWS, DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS
+from dedup import DuplicateDetector
+from directory_reader import DirectoryReader
+from embedding_model import EmbeddingModel, get_embedding_model
+from resume_scorer import build_category_index, get_jd_category, get_resume_category, stack_embeddings, \
+    top_k_indices
+from tracing import print_summary
+
+COLUMNS = ["file", "resume_name", "jd_name", "matching_score", "error", "duplicate_of"]
+
+
+def prefetch(iterable, maxsize):
+    """
+    Runs an iterable on a background thread, keeping at most maxsize items ready ahead of the consumer.
+
+    Exceptions raised by the iterable are re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put((item, None))
+        except BaseException as e:
+            items.put((None, e))
+        items.put((done, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item, error = items.get()
+        if error is not None:
+            raise error
+        if item is done:
+            return
+        yield item
+
+
+def batched(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+class Checkpoint:
+    """
+    An append-only log of the files whose results have been written.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as handle:
+                self.done = {line.rstrip("\n") for line in handle if line.strip()}
+
+    def mark(self, files):
+        with open(self.path, "a", encoding="utf-8") as handle:
+            handle.writelines(file + "\n" for file in files)
+            handle.flush()
+            os.fsync(handle.fileno())
+        self.done.update(files)
+
+
+class ResultWriter:
+    """
+    Appends result rows to a .csv file, or writes them as numbered part files into a .parquet directory.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        if self.parquet:
+            os.makedirs(path, exist_ok=True)
+            self.next_part = len([name for name in os.listdir(path) if name.endswith(".parquet")])
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                with open(path, "w", newline="", encoding="utf-8") as handle:
+                    csv.writer(handle).writerow(COLUMNS)
+
+    def write(self, rows):
+        """
+        Writes rows durably, so they can be recorded in the checkpoint afterwards.
+        """
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pylist([dict(zip(COLUMNS, row)) for row in rows], schema=pa.schema([
+                ("file", pa.string()), ("resume_name", pa.string()), ("jd_name", pa.string()),
+                ("matching_score", pa.int64()), ("error", pa.string()), ("duplicate_of", pa.string())]))
+            part_file = os.path.join(self.path, f"part-{self.next_part:05d}.parquet")
+            # A part file only appears once it is complete
+            pq.write_table(table, part_file + ".tmp")
+            os.replace(part_file + ".tmp", part_file)
+            self.next_part += 1
+        else:
+            with open(self.path, "a", newline="", encoding="utf-8") as handle:
+                csv.writer(handle).writerows(rows)
+                handle.flush()
+                os.fsync(handle.fileno())
+
+
+class JdMatcher:
+    """
+    Finds the best matching JD for resume embeddings. JDs are stacked and grouped by category once.
+    """
+    def __init__(self, jd_embeddings):
+        self.jd_names, self.jd_matrix = stack_embeddings(jd_embeddings)
+        self.jd_index = build_category_index(self.jd_names, get_jd_category)
+        self.all_rows = np.arange(len(self.jd_names))
+
+    def jd_rows(self, resume_name):
+        # Resumes whose job title has no JD category are matched against every JD
+        try:
+            return self.jd_index.get(get_resume_category(resume_name), self.all_rows)
+        except KeyError:
+            return self.all_rows
+
+    def jd_scores(self, resume_matrix):
+        """
+        Returns the cosine similarity of every resume row with every JD, one row per resume.
+        """
+        return resume_matrix @ self.jd_matrix.T
+
+    def best_match(self, resume_name, jd_scores):
+        """
+        Returns the (jd_name, score) pair of the best JD in the resume's category, given its row of jd_scores.
+        """
+        jd_rows = self.jd_rows(resume_name)
+        best = jd_rows[top_k_indices(jd_scores[jd_rows], 1)[0]]
+        return self.jd_names[best], jd_scores[best]
+
+
+def read_batch(dir_reader, files, executor=None):
+    """
+    Reads and extracts one batch of resumes, in executor when one is given.
+
+    Returns:
+        tuple: The files of the batch, the (file, name, text) records read, and a dictionary of file to error.
+    """
+    records = dir_reader.read_files(files, dir_reader.read_resume_file, executor)
+    errors = {file: dir_reader.errors.pop(file) for file in files if file in dir_reader.errors}
+    return files, records, errors
+
+
+def embed_batch(embedding_model, batch, detector=None):
+    """
+    Embeds one batch of resumes. Near-duplicates of a resume seen earlier in the run are not embedded.
+
+    Returns:
+        tuple: The batch, followed by the embeddings keyed by file and a dictionary of duplicate to canonical file.
+    """
+    files, records, errors = batch
+    to_embed = {}
+    duplicate_of = {}
+    for file, _, text in records:
+        canonical = detector.add(file, text) if detector is not None else file
+        if canonical != file:
+            duplicate_of[file] = canonical
+        else:
+            # Keyed by file, since different folders can hold resumes with the same name
+            to_embed[file] = text
+    embeddings = embedding_model.get_embeddings(to_embed) if to_embed else {}
+    return files, records, errors, embeddings, duplicate_of
+
+
+def score_batch(matcher, batch, canonical_scores):
+    """
+    Scores one batch of resumes and returns the files that were scored and the output rows, which include a row
+    for every file that could not be read.
+
+    The JD scores of every embedded resume are kept in canonical_scores, so a near-duplicate in this or a later
+    batch is scored from its canonical copy. A canonical copy always comes first, since batches run in order.
+    """
+    files, records, errors, embeddings, duplicate_of = batch
+    rows = [[file, None, None, None, str(error), None] for file, error in errors.items()]
+    embedded_files = [file for file, _, _ in records if file not in duplicate_of]
+    if embedded_files:
+        _, resume_matrix = stack_embeddings({file: embeddings[file] for file in embedded_files})
+        for file, jd_scores in zip(embedded_files, matcher.jd_scores(resume_matrix).astype(np.float32)):
+            canonical_scores[file] = jd_scores
+    for file, name, _ in records:
+        jd_name, score = matcher.best_match(name, canonical_scores[duplicate_of.get(file, file)])
+        rows.append([file, name, jd_name, int(round(float(score) * 100.0)), None, duplicate_of.get(file)])
+    return [file for file, _, _ in records], rows
+
+
+def score_resumes(files, jd_embeddings, output, dir_reader, embedding_model, batch_size=BATCH_SCORING_BATCH_SIZE,
+                  queue_size=BATCH_SCORING_QUEUE_SIZE, flush_rows=BATCH_SCORING_FLUSH_ROWS, detector=None):
+    """
+    Scores resume files against the JDs and writes one row per file to output, skipping files already done.
+
+    Files that could not be read get an error row but are not checkpointed, so a resumed run retries them and
+    adds another row for them. Reading runs in one pool of spawned processes for the whole run, since forking this
+    process while the embedding model runs on another thread can deadlock the children.
+
+    Args:
+        files (list): Resume file paths.
+        jd_embeddings (dict): JD names to embeddings.
+        output (str): A .csv file or a .parquet directory. The checkpoint is written next to it.
+        dir_reader (DirectoryReader): Reader used to extract the resume text.
+        embedding_model (EmbeddingModel): Model used to embed the resumes.
+        batch_size (int): Resumes per batch.
+        queue_size (int): Batches buffered between stages.
+        flush_rows (int): Rows buffered before they are written and checkpointed.
+        detector (DuplicateDetector, optional): When given, near-duplicates of a resume scored earlier in the run
+            reuse its scores instead of being embedded, and their rows name it in the duplicate_of column.
+
+    Returns:
+        int: Number of files scored in this run.
+    """
+    checkpoint = Checkpoint(output.rstrip("/") + ".checkpoint")
+    pending = [file for file in files if file not in checkpoint.done]
+    print("Resumes ->", len(files), "already scored ->", len(files) - len(pending), "to score ->", len(pending))
+    writer = ResultWriter(output)
+    matcher = JdMatcher(jd_embeddings)
+
+    canonical_scores = {}
+    buffered_files, buffered_rows, scored = [], [], 0
+
+    def flush():
+        nonlocal scored
+        if buffered_rows:
+            writer.write(buffered_rows)
+            checkpoint.mark(buffered_files)
+            scored += len(buffered_files)
+            print("Scored ->", len(checkpoint.done), "/", len(files))
+            buffered_files.clear()
+            buffered_rows.clear()
+
+    pool = ProcessPoolExecutor(max_workers=dir_reader.workers, mp_context=multiprocessing.get_context("spawn")) \
+        if dir_reader.workers > 1 else nullcontext()
+    with pool as executor:
+        read = prefetch((read_batch(dir_reader, batch, executor) for batch in batched(pending, batch_size)),
+                        queue_size)
+        embedded = prefetch((embed_batch(embedding_model, batch, detector) for batch in read), queue_size)
+        try:
+            for batch_files, rows in (score_batch(matcher, batch, canonical_scores) for batch in embedded):
+                buffered_files.extend(batch_files)
+                buffered_rows.extend(rows)
+                if len(buffered_rows) >= flush_rows:
+                    flush()
+        finally:
+            # Batches that finished before an interruption are kept
+            flush()
+    if detector is not None:
+        print("Near-duplicates -> ", sum(len(d) for d in detector.clusters().values()))
+    return scored
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score resumes against the JD embeddings in resumable batches.")
+    parser.add_argument("--resume-path", default=RESUME_PATH, help="Glob of the resume files")
+    parser.add_argument("--output", default=os.path.join(OUTPUT_PATH, "resume_scores.csv"),
+                        help="A .csv file, or a .parquet directory of part files")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SCORING_BATCH_SIZE)
+    parser.add_argument("--queue-size", type=int, default=BATCH_SCORING_QUEUE_SIZE)
+    parser.add_argument("--flush-rows", type=int, default=BATCH_SCORING_FLUSH_ROWS)
+    parser.add_argument("--no-dedup", action="store_true", help="Embed near-duplicate resumes too")
+    args = parser.parse_args()
+
+    dir_reader = DirectoryReader(JD_PATH, args.resume_path, workers=INGEST_WORKERS, chunk_size=INGEST_CHUNK_SIZE,
+                                 ocr_dpi=OCR_DPI, ocr_workers=OCR_WORKERS, pdf_backends=PDF_BACKENDS,
+                                 pdf_timeout=PDF_TIMEOUT_SECONDS, pdf_max_pages=PDF_MAX_PAGES)
+    score_resumes(dir_reader.list_resume_files(), EmbeddingModel.read_embeddings(JD_EMBEDDINGS_FILENAME), args.output,
+                  dir_reader, get_embedding_model(), args.batch_size, args.queue_size, args.flush_rows,
+                  None if args.no_dedup else DuplicateDetector(DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS))
+    print("Stage timings........")
+    print_summary()
@@ -0,0 +1,362 @@
+# Description: End-to-end performance benchmarks on a synthetic corpus, with an offline LLM stub.
+# Generates text-layer and image-only resume PDFs of several page counts plus JDs named like jd_data, then times
+# PDF text extraction, the OCR path, BERT embeddings, get_similarity_dict at growing corpus sizes, and a full
+# detailed report against the fake completion server. Throughput, p50/p95 latency and peak RSS of each benchmark
+# are written to JSON and compared with a stored baseline; regressions beyond the tolerance fail the run.
+# Every benchmark group runs in a fresh process, so its peak RSS does not depend on the groups run before it.
+# Benchmarks whose dependencies are missing (OCR tools, torch) are reported as skipped.
+# Usage:
+#   python benchmark.py --update-baseline        # record benchmark_baseline.json on this machine
+#   python benchmark.py                          # run and compare against it
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import psutil
+
+from constants import LLM_MODEL_NAME, LLM_MAX_CONCURRENCY, TEMPLATE_CONTENT, RESUME_TOKEN_BUDGET, \
+    JD_TOKEN_BUDGET, OCR_DPI, OCR_WORKERS, EMBEDDING_BACKEND, BENCHMARK_BASELINE_FILENAME, \
+    BENCHMARK_RESULTS_FILENAME
+from directory_reader import DirectoryReader, get_pdf_page_count, load_pytesseract
+from resume_scorer import RESUME_JD_COMBI_TO_MATCH, get_similarity_dict
+from tracing import tracer
+
+RESUME_WORDS = ("python sql spark airflow kafka etl pipeline warehouse dashboard tableau power bi modelling "
+                "statistics regression forecasting pandas numpy tensorflow pytorch docker kubernetes aws azure gcp "
+                "stakeholders delivered improved reduced latency cost revenue team led designed built migrated "
+                "experience skills education projects certifications university bachelor master analyst engineer "
+                "scientist architect machine learning data quality governance streaming batch api microservices").split()
+JD_COMPANIES = ("google", "amazon", "accenture", "infosys", "ola", "ubs", "inpost", "rocketlane")
+# Regression thresholds: (metric, True when higher is worse)
+REGRESSION_METRICS = (("p95_ms", True), ("throughput", False), ("peak_rss_mb", True))
+
+
+def synthetic_text(rng, words):
+    return " ".join(rng.choice(RESUME_WORDS) for _ in range(words))
+
+
+def write_text_pdf(file, page_texts):
+    """
+    Writes a minimal PDF with a Helvetica text layer, one page per text. Needs no PDF library.
+    """
+    objects = {3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    page_ids = []
+    for text in page_texts:
+        lines = textwrap.wrap(text, 95)[:60]
+        escaped = (line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines)
+        stream = ("BT /F1 10 Tf 12 TL 50 800 Td " + " ".join(f"({line}) '" for line in escaped) + " ET").encode()
+        content_id, page_id = len(objects) + 3, len(objects) + 4
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode()
+        page_ids.append(page_id)
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offsets[object_id] for object_id in sorted(objects))
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(file, "wb") as handle:
+        handle.write(output)
+
+
+def write_image_pdf(file, page_texts, dpi=100):
+    """
+    Writes a scanned-looking PDF: every page is a rendered image, with no text layer. Needs Pillow.
+    """
+    from PIL import Image, ImageDraw
+    pages = []
+    for text in page_texts:
+        page = Image.new("L", (int(8.27 * dpi), int(11.69 * dpi)), 255)
+        draw = ImageDraw.Draw(page)
+        for i, line in enumerate(textwrap.wrap(text, 90)[:60]):
+            draw.text((40, 40 + 14 * i), line, fill=0)
+        pages.append(page)
+    pages[0].save(file, "PDF", resolution=dpi, save_all=True, append_images=pages[1:])
+
+
+def generate_corpus(directory, page_counts=(1, 2, 5), resumes_per_count=4, jds_per_category=4, seed=0):
+    """
+    Generates a synthetic corpus under directory.
+
+    Returns:
+        dict: Lists of "text_pdfs" and "image_pdfs" (paths, in resume_data/<Job Title>/resume-N.pdf layout, with
+            the page count of each) and "jds" (paths named like jd_data/de1_ola.txt). image_pdfs is empty when
+            Pillow is not installed.
+    """
+    rng = random.Random(seed)
+    corpus = {"text_pdfs": [], "image_pdfs": [], "jds": []}
+    titles = [title.replace("_", " ").title().replace("Mlops", "MLOps") for title in RESUME_JD_COMBI_TO_MATCH]
+    number = 0
+    for kind in ("text_pdfs", "image_pdfs"):
+        for pages in page_counts:
+            for _ in range(resumes_per_count):
+                number += 1
+                folder = os.path.join(directory, "resume_data", titles[number % len(titles)])
+                os.makedirs(folder, exist_ok=True)
+                file = os.path.join(folder, f"resume-{number}.pdf")
+                page_texts = [synthetic_text(rng, 350) for _ in range(pages)]
+                try:
+                    (write_text_pdf if kind == "text_pdfs" else write_image_pdf)(file, page_texts)
+                except ImportError:
+                    continue
+                corpus[kind].append((file, pages))
+    os.makedirs(os.path.join(directory, "jd_data"), exist_ok=True)
+    for category in RESUME_JD_COMBI_TO_MATCH.values():
+        for i in range(1, jds_per_category + 1):
+            file = os.path.join(directory, "jd_data", f"{category}{i}_{rng.choice(JD_COMPANIES)}.txt")
+            with open(file, "w", encoding="utf-8") as handle:
+                handle.write(synthetic_text(rng, 300))
+            corpus["jds"].append(file)
+    return corpus
+
+
+class PeakRssSampler:
+    """
+    Samples the resident set size of this process and all its child processes on a background thread and keeps the
+    peak of their sum, in MB. The children do much of the work: PDF extraction processes, pdftoppm and tesseract.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def rss(self):
+        total = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:  # the child exited since it was listed
+                pass
+        return total
+
+    def sample(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, self.rss())
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.rss()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.rss())
+
+    @property
+    def peak_mb(self):
+        return self.peak / 2 ** 20
+
+
+def measure(function, calls, items_per_call=1, warmup=0):
+    """
+    Times function(call) for every call and summarizes the latencies.
+
+    Args:
+        function (callable): The operation under test.
+        calls (list): One argument per timed call.
+        items_per_call (int): Items each call processes, for the throughput.
+        warmup (int): Untimed calls made first with calls[0], e.g. to load a model.
+
+    Returns:
+        dict: "calls", "items", "throughput" (items/s), "p50_ms", "p95_ms", "mean_ms" and "peak_rss_mb".
+    """
+    for _ in range(warmup):
+        function(calls[0])
+    latencies = []
+    with PeakRssSampler() as sampler:
+        for call in calls:
+            start = time.perf_counter()
+            function(call)
+            latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies)
+    return {"calls": len(calls), "items": len(calls) * items_per_call,
+            "throughput": len(calls) * items_per_call / latencies.sum(),
+            "p50_ms": float(np.percentile(latencies, 50) * 1000), "p95_ms": float(np.percentile(latencies, 95) * 1000),
+            "mean_ms": float(latencies.mean() * 1000), "peak_rss_mb": sampler.peak_mb}
+
+
+def bench_pdf_text(corpus, results):
+    for pages in sorted({pages for _, pages in corpus["text_pdfs"]}):
+        files = [file for file, file_pages in corpus["text_pdfs"] if file_pages == pages]
+        # The warmup call starts the PDF extraction process, so its spawn cost is not timed
+        results[f"extract_text_from_pdf/{pages}_pages"] = measure(DirectoryReader.extract_text_from_pdf, files * 5,
+                                                                  warmup=1)
+
+
+def bench_ocr(corpus, results):
+    dir_reader = DirectoryReader("", "", ocr_dpi=OCR_DPI, ocr_workers=OCR_WORKERS)
+    if not corpus["image_pdfs"]:
+        results["ocr"] = {"skipped": "Pillow is not installed, so no image-only PDFs were generated"}
+        return
+    try:
+        # A page that fails to OCR is skipped rather than raised, so check for poppler and tesseract up front
+        get_pdf_page_count(corpus["image_pdfs"][0][0])
+        load_pytesseract().get_tesseract_version()
+    except Exception as e:
+        results["ocr"] = {"skipped": f"OCR is unavailable: {type(e).__name__}: {e}"}
+        return
+    for pages in sorted({pages for _, pages in corpus["image_pdfs"]}):
+        files = [file for file, file_pages in corpus["image_pdfs"] if file_pages == pages]
+        results[f"ocr/{pages}_pages"] = measure(dir_reader.extract_text_with_ocr_fallback, files, pages, warmup=1)
+
+
+def bench_embeddings(results, sizes=(8, 32)):
+    try:
+        from embedding_model import get_embedding_model
+        embedding_model = get_embedding_model()
+    except Exception as e:  # missing packages, or no network to download the model
+        results["get_embeddings"] = {"skipped": f"The embedding model is unavailable: {type(e).__name__}: {e}"}
+        return
+    rng = random.Random(1)
+    for size in sizes:
+        data = {f"resume_{i}": synthetic_text(rng, 400) for i in range(size)}
+        results[f"get_embeddings/{EMBEDDING_BACKEND}/{size}_docs"] = measure(embedding_model.get_embeddings,
+                                                                             [data] * 3, size, warmup=1)
+
+
+def bench_similarity(results, sizes=(1000, 10000, 50000), dim=768):
+    rng = np.random.default_rng(2)
+    jd_embeddings = {f"jd_data/{category}{i}_{JD_COMPANIES[i]}": rng.normal(size=dim)
+                     for category in RESUME_JD_COMBI_TO_MATCH.values() for i in range(1, 5)}
+    titles = list(RESUME_JD_COMBI_TO_MATCH)
+    for size in sizes:
+        resume_embeddings = {f"{titles[i % len(titles)]}_resume_{i}": vector
+                             for i, vector in enumerate(rng.normal(size=(size, dim)).astype(np.float32))}
+        results[f"get_similarity_dict/{size}_resumes"] = measure(
+            lambda resumes: get_similarity_dict(jd_embeddings, resumes), [resume_embeddings] * 5, size)
+
+
+def bench_report(results, runs=5, min_latency=0.2, max_latency=0.8):
+    """
+    Times the detailed report as the app requests it: every section concurrently, through chat_completion, against
+    a fake completion server that adds min_latency to max_latency seconds to every response. Nothing is cached.
+    """
+    import openai
+    from fake_completion_server import start_server
+    from llm_client import chat_completion, map_concurrently
+    from prompt_builder import build_report_sections, build_system_prompt
+
+    server = start_server(min_latency=min_latency, max_latency=max_latency)
+    openai.api_base, openai.api_key = server.api_base, "benchmark"
+    rng = random.Random(3)
+    system_prompt = build_system_prompt(TEMPLATE_CONTENT, synthetic_text(rng, 900), synthetic_text(rng, 500),
+                                        LLM_MODEL_NAME, RESUME_TOKEN_BUDGET, JD_TOKEN_BUDGET)
+    sections = build_report_sections()
+
+    def generate_report(_):
+        return map_concurrently(lambda section: chat_completion(
+            [{"role": "system", "content": system_prompt}, {"role": "user", "content": section[2]}],
+            LLM_MODEL_NAME), sections, LLM_MAX_CONCURRENCY)
+
+    try:
+        results[f"generate_report/concurrency_{LLM_MAX_CONCURRENCY}"] = measure(generate_report, list(range(runs)),
+                                                                               len(sections))
+    finally:
+        server.shutdown()
+
+
+BENCHMARKS = {"pdf": lambda corpus, results: bench_pdf_text(corpus, results), "ocr": bench_ocr,
+              "embeddings": lambda corpus, results: bench_embeddings(results),
+              "similarity": lambda corpus, results: bench_similarity(results),
+              "report": lambda corpus, results: bench_report(results)}
+
+
+def run_benchmark(name, corpus):
+    """
+    Runs one benchmark group. It is called in a fresh process, so peak RSS only covers that group.
+
+    Returns:
+        tuple: The group's results and the tracer summary of its stages.
+    """
+    results = {}
+    BENCHMARKS[name](corpus, results)
+    return results, tracer.summary()
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Returns a list of regression messages for benchmarks that got worse than the baseline by more than tolerance.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if "skipped" in result or not reference or "skipped" in reference:
+            continue
+        for metric, higher_is_worse in REGRESSION_METRICS:
+            current, previous = result[metric], reference[metric]
+            change = (current - previous) / previous if previous else 0.0
+            if (change if higher_is_worse else -change) > tolerance:
+                regressions.append(f"{name}: {metric} {previous:.2f} -> {current:.2f} ({change:+.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the performance benchmarks.")
+    parser.add_argument("--output", default=BENCHMARK_RESULTS_FILENAME)
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE_FILENAME)
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown per metric")
+    parser.add_argument("--only", nargs="*", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    args = parser.parse_args()
+
+    results = {}
+    stages = {}
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = generate_corpus(directory)
+        print("Synthetic corpus ->", len(corpus["text_pdfs"]), "text PDFs,", len(corpus["image_pdfs"]),
+              "image-only PDFs,", len(corpus["jds"]), "JDs")
+        for name in args.only:
+            print("Running", name, "benchmarks........")
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                group_results, group_stages = executor.submit(run_benchmark, name, corpus).result()
+            results.update(group_results)
+            stages.update(group_stages)
+
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name}: skipped ({result['skipped']})")
+        else:
+            print(f"{name}: {result['throughput']:.1f} items/s, p50 {result['p50_ms']:.1f} ms, "
+                  f"p95 {result['p95_ms']:.1f} ms, peak RSS {result['peak_rss_mb']:.0f} MB")
+
+    report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+                       "platform": platform.platform(), "cpu_count": os.cpu_count()},
+              "results": results, "stages": stages}
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print("Results ->", args.output)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print("Baseline updated ->", args.baseline)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as handle:
+            regressions = compare_to_baseline(results, json.load(handle)["results"], args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        print("Regressions ->", len(regressions))
+        sys.exit(1 if regressions else 0)
+    else:
+        print("No baseline at", args.baseline, "- run with --update-baseline to record one")
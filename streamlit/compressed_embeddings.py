@@ -0,0 +1,251 @@
+# Description: A compressed in-memory tier of the resume embeddings for large pools.
+# Unit-normalized resume vectors are reduced with PCA and scalar-quantized to int8, one scale per dimension, so a
+# resume takes `dims` bytes in RAM instead of 768 fp32 values (3 KB). A coarse pass scores every resume on the codes,
+# and only the top candidates are re-scored exactly from the full vectors, which can stay on disk in the
+# memory-mapped embedding store.
+# Usage:
+#   python compressed_embeddings.py build --dims 256
+#   python compressed_embeddings.py report --rerank 3
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from constants import JD_EMBEDDINGS_FILENAME, RESUME_EMBEDDINGS_FILENAME, COMPRESSED_EMBEDDINGS_FILENAME, \
+    COMPRESSED_EMBEDDING_DIMS
+from embedding_model import EmbeddingModel
+from resume_scorer import build_category_index, get_jd_category, get_resume_category, get_similarity_dict, \
+    stack_embeddings, top_k_indices
+
+
+def normalized_rows(embeddings, keys, block_size=10000):
+    """
+    Yields the embeddings of keys as blocks of unit-norm float32 rows, so large stores are never copied at once.
+    """
+    matrix = getattr(embeddings, "matrix", None)  # EmbeddingStore rows are already stacked, in key order
+    for start in range(0, len(keys), block_size):
+        if matrix is not None:
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+        else:
+            block = np.asarray([embeddings[key] for key in keys[start:start + block_size]], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        yield block / np.where(norms == 0, 1, norms)
+
+
+class CompressedEmbeddings:
+    """
+    PCA-reduced, int8-quantized resume embeddings with coarse scoring and exact re-ranking.
+
+    A unit resume vector x is approximated as mean + components.T @ (codes * scales), so its cosine similarity
+    with a unit query q is approximately mean @ q + codes @ (scales * (components @ q)).
+    """
+    def __init__(self, keys, codes, scales, mean, components):
+        self.keys = keys
+        self.codes = codes
+        self.scales = scales
+        self.mean = mean
+        self.components = components
+        self.row_index = {key: row for row, key in enumerate(keys)}
+
+    @classmethod
+    def fit(cls, embeddings, dims=256, sample_size=20000, seed=0):
+        """
+        Fits the PCA basis on a sample of the resumes and encodes all of them.
+
+        Args:
+            embeddings (dict): Resume names to embeddings, e.g. an EmbeddingStore.
+            dims (int): Number of PCA dimensions kept, at most the embedding size and the sample size.
+            sample_size (int): Maximum number of resumes the PCA basis is fitted on.
+            seed (int): Seed for the sample.
+
+        Returns:
+            CompressedEmbeddings: The compressed tier.
+        """
+        keys = list(embeddings.keys())
+        sample_keys = keys
+        if len(keys) > sample_size:
+            rows = np.sort(np.random.default_rng(seed).choice(len(keys), sample_size, replace=False))
+            sample_keys = [keys[row] for row in rows]
+        if sample_keys is not keys:
+            embeddings_sample = {key: embeddings[key] for key in sample_keys}
+        else:
+            embeddings_sample = embeddings
+        sample = np.concatenate(list(normalized_rows(embeddings_sample, sample_keys)))
+        mean = sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        components = vt[:dims].astype(np.float32)
+
+        reduced = np.concatenate([(block - mean) @ components.T for block in normalized_rows(embeddings, keys)])
+        scales = np.abs(reduced).max(axis=0) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.round(reduced / scales), -127, 127).astype(np.int8)
+        return cls(keys, codes, scales.astype(np.float32), mean.astype(np.float32), components)
+
+    def memory_footprint(self):
+        """
+        Returns the bytes held in RAM by the codes and by the shared PCA/quantization parameters, next to the bytes
+        of the same resumes as fp32 vectors.
+        """
+        shared = self.scales.nbytes + self.mean.nbytes + self.components.nbytes
+        fp32 = len(self.keys) * len(self.mean) * 4
+        total = self.codes.nbytes + shared
+        return {"resumes": len(self.keys), "code_bytes": self.codes.nbytes, "shared_bytes": shared,
+                "fp32_bytes": fp32, "bytes_per_resume": total / max(len(self.keys), 1),
+                "reduction": fp32 / total if total else float("nan")}
+
+    def coarse_scores(self, queries, block_size=65536):
+        """
+        Approximates the cosine similarity of every resume with each query.
+
+        Args:
+            queries (numpy.ndarray): A (m, dim) matrix of query embeddings, e.g. JD embeddings.
+            block_size (int): Resumes decoded to float at a time.
+
+        Returns:
+            numpy.ndarray: A (len(keys), m) float32 matrix of approximate scores.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, len(self.mean))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        projected = (queries @ self.components.T) * self.scales
+        scores = np.empty((len(self.keys), len(queries)), dtype=np.float32)
+        for start in range(0, len(self.keys), block_size):
+            scores[start:start + block_size] = self.codes[start:start + block_size].astype(np.float32) @ projected.T
+        return scores + queries @ self.mean
+
+    def top_resumes(self, query, k=50, full_embeddings=None, oversample=4):
+        """
+        Finds the resumes most similar to a query: a coarse pass over all codes, then an exact re-rank.
+
+        Args:
+            query (numpy.ndarray): A JD embedding.
+            k (int): Number of resumes to return.
+            full_embeddings (dict, optional): Full resume embeddings for the re-rank, e.g. the memory-mapped
+                EmbeddingStore. Without them the coarse scores are returned.
+            oversample (int): The coarse pass keeps k * oversample candidates for the re-rank.
+
+        Returns:
+            list: (resume name, score) pairs, best first.
+        """
+        scores = self.coarse_scores(query)[:, 0]
+        if full_embeddings is None:
+            return [(self.keys[row], float(scores[row])) for row in top_k_indices(scores, k)]
+        candidate_keys = [self.keys[row] for row in top_k_indices(scores, k * oversample)]
+        if not candidate_keys:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        candidates = np.concatenate(list(normalized_rows({key: full_embeddings[key] for key in candidate_keys},
+                                                         candidate_keys)))
+        exact = candidates @ (query / np.linalg.norm(query))
+        return [(candidate_keys[i], float(exact[i])) for i in top_k_indices(exact, k)]
+
+    def get_similarity_dict(self, jd_embeddings, full_embeddings=None, rerank_k=3):
+        """
+        The compressed counterpart of resume_scorer.get_similarity_dict, with the same output format.
+
+        Every resume is scored against the JDs of its category on the codes, and its rerank_k best JDs are then
+        re-scored exactly, so the top match uses full precision while the rest keep their approximate scores.
+
+        Args:
+            jd_embeddings (dict): A dictionary of job description embeddings.
+            full_embeddings (dict, optional): Full resume embeddings for the re-rank. Without them no re-rank is done.
+            rerank_k (int): Number of JDs per resume re-scored exactly.
+
+        Returns:
+            dict: Resume names to dictionaries of JD names and their {"score": ...}.
+        """
+        jd_names, jd_matrix = stack_embeddings(jd_embeddings)
+        jd_index = build_category_index(jd_names, get_jd_category)
+        resume_index = build_category_index(self.keys, get_resume_category)
+        scores = self.coarse_scores(jd_matrix)
+
+        similarity_dict = {}
+        for category, jd_rows in jd_index.items():
+            resume_rows = resume_index.get(category)
+            if resume_rows is None:
+                continue
+            for resume_row in resume_rows:
+                row_scores = scores[resume_row, jd_rows].astype(np.float64)
+                name = self.keys[resume_row]
+                if full_embeddings is not None and rerank_k:
+                    top = top_k_indices(row_scores, rerank_k)
+                    vector = np.asarray(full_embeddings[name], dtype=np.float64)
+                    row_scores[top] = jd_matrix[jd_rows[top]] @ (vector / np.linalg.norm(vector))
+                similarity_dict[name] = {jd_names[jd_row]: {"score": row_scores[j]} for j, jd_row in enumerate(jd_rows)}
+        return similarity_dict
+
+    def save(self, file_name):
+        tmp_file = file_name + ".tmp"
+        with open(tmp_file, "wb") as handle:
+            np.savez(handle, codes=self.codes, scales=self.scales, mean=self.mean, components=self.components,
+                     keys=json.dumps(self.keys))
+        os.replace(tmp_file, file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        with np.load(file_name) as data:
+            return cls(json.loads(str(data["keys"])), data["codes"], data["scales"], data["mean"], data["components"])
+
+
+def compare_similarity_dicts(reference, candidate):
+    """
+    Returns the fraction of resumes whose top JD is the same in both similarity dicts, and the mean and maximum
+    absolute score difference.
+    """
+    agreements, differences = [], []
+    for resume_name, jd_scores in reference.items():
+        jd_names = list(jd_scores)
+        reference_scores = np.array([jd_scores[jd]["score"] for jd in jd_names])
+        candidate_scores = np.array([candidate[resume_name][jd]["score"] for jd in jd_names])
+        agreements.append(top_k_indices(reference_scores, 1)[0] == top_k_indices(candidate_scores, 1)[0])
+        differences.append(np.abs(reference_scores - candidate_scores))
+    differences = np.concatenate(differences)
+    return float(np.mean(agreements)), float(differences.mean()), float(differences.max())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and evaluate the compressed resume embedding tier.")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--dims", type=int, default=COMPRESSED_EMBEDDING_DIMS)
+    parser.add_argument("--rerank", type=int, default=3, help="JDs per resume re-scored exactly")
+    parser.add_argument("--k", type=int, default=10, help="Resumes per JD compared in the retrieval check")
+    args = parser.parse_args()
+
+    resume_embeddings = EmbeddingModel.read_embeddings(RESUME_EMBEDDINGS_FILENAME)
+    if args.command == "build":
+        compressed = CompressedEmbeddings.fit(resume_embeddings, args.dims)
+        compressed.save(COMPRESSED_EMBEDDINGS_FILENAME)
+        print("Compressed", len(compressed.keys), "resumes to", compressed.codes.shape[1], "int8 dims ->",
+              COMPRESSED_EMBEDDINGS_FILENAME)
+    else:
+        compressed = CompressedEmbeddings.load(COMPRESSED_EMBEDDINGS_FILENAME)
+        jd_embeddings = EmbeddingModel.read_embeddings(JD_EMBEDDINGS_FILENAME)
+        footprint = compressed.memory_footprint()
+        print(f"Memory: {footprint['code_bytes'] + footprint['shared_bytes']:,} bytes vs {footprint['fp32_bytes']:,} "
+              f"fp32 bytes ({footprint['bytes_per_resume']:.0f} bytes/resume, {footprint['reduction']:.1f}x less, "
+              f"shared PCA parameters {footprint['shared_bytes']:,} bytes)")
+
+        start = time.perf_counter()
+        exact = get_similarity_dict(jd_embeddings, resume_embeddings)
+        exact_seconds = time.perf_counter() - start
+        for label, full_embeddings in (("coarse only", None), (f"re-rank top {args.rerank}", resume_embeddings)):
+            start = time.perf_counter()
+            candidate = compressed.get_similarity_dict(jd_embeddings, full_embeddings, args.rerank)
+            seconds = time.perf_counter() - start
+            agreement, mean_diff, max_diff = compare_similarity_dicts(exact, candidate)
+            print(f"{label}: top-JD agreement {agreement:.1%}, score difference mean {mean_diff:.5f} "
+                  f"max {max_diff:.5f}, {seconds * 1000:.1f} ms (exact {exact_seconds * 1000:.1f} ms)")
+
+        resume_names, resume_matrix = stack_embeddings(resume_embeddings)
+        recalls = {"coarse only": [], "re-ranked": []}
+        for jd_name in jd_embeddings:
+            query = np.asarray(jd_embeddings[jd_name], dtype=np.float64)
+            truth = {resume_names[row] for row in top_k_indices(resume_matrix @ (query / np.linalg.norm(query)),
+                                                                 args.k)}
+            for label, full_embeddings in (("coarse only", None), ("re-ranked", resume_embeddings)):
+                found = {name for name, _ in compressed.top_resumes(query, args.k, full_embeddings)}
+                recalls[label].append(len(found & truth) / len(truth))
+        for label, values in recalls.items():
+            print(f"Top-{args.k} resumes per JD, {label}: recall {np.mean(values):.1%}")
@@ -1,13 +1,53 @@
-import streamlit as st
+import os
 JD_PATH = "../jd_data/*"
 RESUME_PATH = "../resume_data/*/*"
-OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
 EMBEDDING_MODEL_NAME = "bert-base-uncased"
+EMBEDDING_BACKEND = "torch"  # "torch" (fp32), "torch-int8" (dynamic quantization) or "onnx" (needs onnxruntime)
+EMBEDDING_ONNX_PATH = "bert-base-uncased.onnx"
 OUTPUT_PATH = "./output/"
-JD_EMBEDDINGS_FILENAME = "jd_embeddings_large.pkl"
-RESUME_EMBEDDINGS_FILENAME = "resume_embeddings_large.pkl"
-IS_EMBEDDINGS_CREATED = True
+JD_EMBEDDINGS_FILENAME = "jd_embeddings_large.npy"
+RESUME_EMBEDDINGS_FILENAME = "resume_embeddings_large.npy"
+LEGACY_RESUME_EMBEDDINGS_FILENAME = "resume_embeddings_large.pkl"  # fp32 reference for embedding_parity.py
+EMBEDDING_STORE_DTYPE = "float32"  # "float16" halves the store size
+EMBEDDINGS_MANIFEST_FILENAME = "embeddings_manifest.json"
+DEDUP_INDEX_FILENAME = "resume_dedup_index.npz"  # MinHash signatures of the resumes, kept by resume_scorer.py
+DEDUP_THRESHOLD = 0.9  # estimated Jaccard similarity of word shingles above which resumes are near-duplicates
+DEDUP_NUM_PERM = 128
+DEDUP_BANDS = 16
+DEDUP_MAX_UPLOADS = 1000  # uploads the app remembers for near-duplicate notes; only their signatures are kept
+COMPRESSED_EMBEDDINGS_FILENAME = "resume_embeddings_compressed.npz"  # built by compressed_embeddings.py
+COMPRESSED_EMBEDDING_DIMS = 256  # PCA dimensions of the compressed tier, stored as int8
+RESUME_INDEX_PATH = "resume_index"  # directory written by "python resume_index.py build"
+BENCHMARK_RESULTS_FILENAME = "benchmark_results.json"  # written by benchmark.py on every run
+BENCHMARK_BASELINE_FILENAME = "benchmark_baseline.json"  # machine-specific, record with --update-baseline
+INGEST_WORKERS = os.cpu_count() or 1  # processes used to read and OCR documents; 1 reads serially
+INGEST_CHUNK_SIZE = 4
+OCR_DPI = 200
+OCR_WORKERS = 2  # pages of one document OCR'd concurrently
+OCR_JOB_WORKERS = 2  # uploads the Streamlit app OCRs at once in the background
+OCR_JOB_MAX_PENDING = 8  # uploads allowed to wait for an OCR worker before new ones are turned away
+OCR_JOB_MAX_RESULTS = 100  # OCR'd upload texts kept in the shared cache
+PDF_BACKENDS = ("pypdfium2", "pypdf", "pdfminer")  # text-extraction backends, in order of preference
+PDF_TIMEOUT_SECONDS = 30  # per document, shared by the backends tried on it; a backend still running is killed
+PDF_MAX_PAGES = 50
+EMBEDDING_BATCH_SIZE = 16
+EMBEDDING_NUM_THREADS = None  # None keeps the torch default intra-op thread count
+BATCH_SCORING_BATCH_SIZE = 256  # resumes read, embedded and scored together by batch_scorer.py
+BATCH_SCORING_QUEUE_SIZE = 2  # batches buffered between pipeline stages
+BATCH_SCORING_FLUSH_ROWS = 1000  # rows written and checkpointed at once
 GEMINI_MODEL_NAME = "gemini-1.5-flash"
+LLM_MODEL_NAME = "gpt-4o-mini-2024-07-18"  # Use GPT-4o mini model
+LLM_MAX_CONCURRENCY = 4  # report sections requested at once
+LLM_REQUESTS_PER_MINUTE = 120  # client-side limit shared by all sessions; 0 disables it
+LLM_RATE_LIMIT_BURST = 12  # requests sent back to back before the limit applies; covers a whole report
+LLM_MAX_RETRIES = 5
+LLM_CACHE_PATH = "llm_response_cache.sqlite3"
+LLM_CACHE_MAX_ENTRIES = 10000
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+DEVELOPER_PANEL = False  # stage timings and the request profiler in the sidebar; ?dev=1 also shows them
+PROFILE_DIR = "profiles"  # cProfile dumps of requests profiled from the developer panel
+RESUME_TOKEN_BUDGET = 3000  # longer resumes are sent as a digest of their sections
+JD_TOKEN_BUDGET = 2000
 TEMPLATE_CONTENT = """You are a helpful assistant. You do not respond as 'User' or pretend to be 'User'. You only 
 respond once as 'assistant'. 
 
@@ -37,8 +77,25 @@ resume_tailoring_prompt = "Advise on how the candidate can tailor their resume:
 relevant_skills_highlight_prompt = "Analyze this resume: <RESUME STARTS HERE> {} <RESUME ENDS HERE> and provide suggestions on restructuring it to foreground skills and experiences pertinent to the job description: <JOB DESCRIPTION STARTS HERE> {}. <JOB DESCRIPTION ENDS HERE>"
 resume_formatting_prompt = "Offer guidance on how the candidate can enhance the formatting of their resume: <RESUME STARTS HERE> {} <RESUME ENDS HERE> to improve visual appeal and readability."
 resume_length_prompt = "Recommend strategies for the candidate to adjust the length of their resume: <RESUME STARTS HERE> {} <RESUME ENDS HERE>, ensuring it is concise while remaining aligned with the requirements in the job description: <JOB DESCRIPTION STARTS HERE> {}. <JOB DESCRIPTION ENDS HERE>"
-resume_edit_prompt = """Tailor this resume: <RESUME STARTS HERE> {} <RESUME ENDS HERE> to better match the job description: <JOB DESCRIPTION STARTS HERE> {}. <JOB DESCRIPTION ENDS HERE> Use the keywords from the job description to enhance the resume. Tailor the summary of resume according to job role. Tailor the skills section. Add relevant keywords from job decription in projects. Then print the resume section wise. Don't make bullet points too lengthy in job and project decription. Keep it short, precise and use key words. Start each bullet point with a strong action verb. Emphasize quantifiable results whenever possible. While not every bullet needs the full STAR method, try to incorporate its principles. Situation: Briefly set the context. Task: Describe your responsibility.
+resume_edit_instructions = """Use the keywords from the job description to enhance the resume. Tailor the summary of resume according to job role. Tailor the skills section. Add relevant keywords from job decription in projects. Then print the resume section wise. Don't make bullet points too lengthy in job and project decription. Keep it short, precise and use key words. Start each bullet point with a strong action verb. Emphasize quantifiable results whenever possible. While not every bullet needs the full STAR method, try to incorporate its principles. Situation: Briefly set the context. Task: Describe your responsibility.
 Action: Explain what you did.
 Result: Highlight the positive outcome.
 Conciseness: Keep bullet points concise and focused. Avoid overly long sentences.
 Consistency: Maintain consistent verb tense and formatting throughout."""
+resume_edit_prompt = "Tailor this resume: <RESUME STARTS HERE> {} <RESUME ENDS HERE> to better match the job description: <JOB DESCRIPTION STARTS HERE> {}. <JOB DESCRIPTION ENDS HERE> " + resume_edit_instructions
+
+# The same prompts for requests whose system message already carries the resume and the job description between
+# their markers (see prompt_builder.build_system_prompt), so they refer to the documents instead of repeating them
+comparison_reference_prompt = "Compare the resume with the job description. Do they match? If not, what are the gaps? Do not make any assumptions about the candidate's skills or experience or the job requirements."
+resume_analysis_reference_prompt = "Provide a detailed summary of the candidate's skills, experience, and qualifications based on the content of the resume."
+job_description_analysis_reference_prompt = "List the key skills, qualifications, and experience required as outlined in the job description."
+gap_analysis_reference_prompt = "Compare the skills and experience detailed in the resume with the requirements listed in the job description. Identify any gaps or mismatches."
+actionable_steps_reference_prompt = "Given the gaps identified between the resume and the job description, suggest actionable steps for the candidate to acquire the necessary skills and experience."
+experience_enhancement_reference_prompt = "Based on the candidate's experience outlined in the resume, recommend practical activities or steps to gain or improve the experience aligned with the needs of the role in the job description."
+additional_qualifications_reference_prompt = "For areas where the resume falls short or does not satisfy the requirements of the job description, suggest specific areas for improvement. Include recommendations for additional qualifications or certifications."
+resume_tailoring_reference_prompt = "Advise on how the candidate can tailor the resume to align more closely with the job description, focusing on emphasizing skills and experiences relevant to the job description."
+relevant_skills_highlight_reference_prompt = "Analyze the resume and provide suggestions on restructuring it to foreground skills and experiences pertinent to the job description."
+resume_formatting_reference_prompt = "Offer guidance on how the candidate can enhance the formatting of the resume to improve visual appeal and readability."
+resume_length_reference_prompt = "Recommend strategies for the candidate to adjust the length of the resume, ensuring it is concise while remaining aligned with the requirements in the job description."
+resume_edit_reference_prompt = "Tailor the resume to better match the job description. " + resume_edit_instructions
+cover_letter_reference_prompt = "Generate a professional cover letter based on the resume and the job description. The cover letter should be tailored to the job role, highlighting relevant skills and experience.Include details like name, address, email, phone number, linkedin, github, personal portfolio etc from resume if provided. Add details of address of company, hiring manager name, company name, job title, company address, city, state, zip code from job decription. set date as the current date. The cover letter should be concise, engaging, and professional."
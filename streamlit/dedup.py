@@ -0,0 +1,248 @@
+# Description: Near-duplicate detection for extracted resume text with MinHash signatures and an LSH index.
+# Re-uploads, lightly edited copies and the same PDF saved under another name share most of their word shingles,
+# so their MinHash signatures agree in most positions. Signatures are split into bands and each band is hashed
+# into a bucket; documents sharing any bucket are candidates, and a candidate counts as a duplicate when the
+# estimated Jaccard similarity reaches the threshold. Lookups touch only the matching buckets, not every document.
+# Usage:
+#   python dedup.py report          # duplicate clusters recorded by resume_scorer.py
+#   python dedup.py scan            # read the resume folder and report its duplicate clusters
+import argparse
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from response_cache import text_hash
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text, size=5):
+    """
+    Returns the set of overlapping size-word shingles of a text, ignoring case, punctuation and layout.
+    """
+    words = WORD_PATTERN.findall((text or "").lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """
+    Computes 32-bit MinHash signatures with num_perm multiply-shift hash functions, ((a * x + b) mod 2**64) >> 32.
+    """
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self.b = rng.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64, endpoint=True)
+
+    def signature(self, text):
+        """
+        Returns the signature of a text, or None when it has no words, e.g. a PDF whose text could not be extracted.
+        """
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)), dtype=np.uint64)
+        if not len(hashes):
+            return None
+        # uint64 arithmetic wraps around, which is the mod 2**64 of the hash family
+        return ((hashes[:, None] * self.a + self.b) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+
+class DuplicateDetector:
+    """
+    An incremental LSH index of MinHash signatures that maps every document to the canonical copy of its cluster.
+
+    The first document of a cluster is its canonical copy. Documents without any words are never indexed or
+    matched, since nothing says they are the same document. It is safe to use from several threads at once.
+    """
+    def __init__(self, threshold=0.9, num_perm=128, bands=16, seed=1):
+        """
+        Args:
+            threshold (float): Minimum estimated Jaccard similarity of shingles for a near-duplicate.
+            num_perm (int): Signature length.
+            bands (int): Number of LSH bands. num_perm must be a multiple of it. More bands find candidates at
+                lower similarity, at the cost of more candidate checks.
+            seed (int): Seed for the hash functions. Signatures are only comparable under the same seed.
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.seed = seed
+        self.rows_per_band = num_perm // bands
+        self.hasher = MinHasher(num_perm, seed)
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+        self.canonical_of = {}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.signatures
+
+    def band_keys(self, signature):
+        r = self.rows_per_band
+        return [signature[band * r:(band + 1) * r].tobytes() for band in range(self.bands)]
+
+    def find(self, signature):
+        """
+        Returns the canonical id of the most similar indexed document at or above the threshold, and the
+        estimated similarity, or (None, 0.0).
+        """
+        candidates = set()
+        for band, key in enumerate(self.band_keys(signature)):
+            candidates.update(self.buckets[band].get(key, ()))
+        best, best_similarity = None, 0.0
+        for candidate in candidates:
+            similarity = float(np.mean(self.signatures[candidate] == signature))
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+        return (self.canonical_of[best], best_similarity) if best is not None else (None, 0.0)
+
+    def query(self, text):
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None, 0.0
+        with self.lock:
+            return self.find(signature)
+
+    def add(self, doc_id, text):
+        """
+        Indexes a document, replacing an earlier version indexed under the same id.
+
+        Args:
+            doc_id (str): Document id, e.g. a file path or a content hash.
+            text (str): Extracted text.
+
+        Returns:
+            str: The canonical id of the document's cluster, which is doc_id when it is not a near-duplicate or has
+                no words.
+        """
+        signature = self.hasher.signature(text)
+        with self.lock:
+            if signature is None:
+                self.remove(doc_id)
+                return doc_id
+            if doc_id in self.signatures:
+                if np.array_equal(self.signatures[doc_id], signature):
+                    return self.canonical_of[doc_id]
+                self.remove(doc_id)
+            canonical, _ = self.find(signature)
+            self.signatures[doc_id] = signature
+            self.canonical_of[doc_id] = canonical or doc_id
+            for band, key in enumerate(self.band_keys(signature)):
+                self.buckets[band].setdefault(key, set()).add(doc_id)
+            return self.canonical_of[doc_id]
+
+    def remove(self, doc_id):
+        """
+        Removes a document. When it was a canonical copy, the next member of its cluster takes over.
+        """
+        with self.lock:
+            signature = self.signatures.pop(doc_id, None)
+            if signature is None:
+                return
+            for band, key in enumerate(self.band_keys(signature)):
+                members = self.buckets[band][key]
+                members.discard(doc_id)
+                if not members:
+                    del self.buckets[band][key]
+            canonical = self.canonical_of.pop(doc_id)
+            if canonical == doc_id:
+                members = [member for member, c in self.canonical_of.items() if c == doc_id]
+                for member in members:
+                    self.canonical_of[member] = members[0]
+
+    def clusters(self):
+        """
+        Returns a dictionary of canonical id to the ids of its near-duplicates, for clusters with duplicates.
+        """
+        with self.lock:
+            clusters = {}
+            for doc_id, canonical in self.canonical_of.items():
+                if doc_id != canonical:
+                    clusters.setdefault(canonical, []).append(doc_id)
+            return clusters
+
+    def save(self, file_name):
+        with self.lock:
+            ids = list(self.signatures)
+            meta = {"threshold": self.threshold, "num_perm": self.num_perm, "bands": self.bands, "seed": self.seed,
+                    "ids": ids, "canonical_of": [self.canonical_of[doc_id] for doc_id in ids]}
+            signatures = np.asarray([self.signatures[doc_id] for doc_id in ids], dtype=np.uint32)
+        tmp_file = file_name + ".tmp"
+        with open(tmp_file, "wb") as handle:
+            np.savez(handle, signatures=signatures.reshape(len(ids), self.num_perm), meta=json.dumps(meta))
+        os.replace(tmp_file, file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        with np.load(file_name) as data:
+            meta = json.loads(str(data["meta"]))
+            signatures = data["signatures"]
+        detector = cls(meta["threshold"], meta["num_perm"], meta["bands"], meta["seed"])
+        for doc_id, canonical, signature in zip(meta["ids"], meta["canonical_of"], signatures):
+            detector.signatures[doc_id] = signature
+            detector.canonical_of[doc_id] = canonical
+            for band, key in enumerate(detector.band_keys(signature)):
+                detector.buckets[band].setdefault(key, set()).add(doc_id)
+        return detector
+
+
+class UploadDeduplicator:
+    """
+    Spots uploads that are near-duplicates of an earlier upload, across all sessions of the Streamlit app.
+
+    Uploads are indexed by content hash and only their signatures are kept, never their text; past max_uploads the
+    oldest are forgotten. A near-duplicate is only reported. It is still analysed from its own text, since the
+    earlier upload may be another user's resume, so their analyses are not shared. Identical uploads do share
+    cached analyses, through the response cache, whose keys include the hash of the resume text.
+    """
+    def __init__(self, max_uploads=1000, threshold=0.9, num_perm=128, bands=16):
+        self.max_uploads = max_uploads
+        self.detector = DuplicateDetector(threshold, num_perm, bands)
+
+    def check(self, resume_text):
+        """
+        Indexes an uploaded resume.
+
+        Returns:
+            str: The content hash of the earlier upload the resume is a near-duplicate of, or None.
+        """
+        resume_id = text_hash(resume_text)
+        with self.detector.lock:
+            canonical_id = self.detector.add(resume_id, resume_text)
+            while len(self.detector) > self.max_uploads:
+                self.detector.remove(next(iter(self.detector.signatures)))
+        return canonical_id if canonical_id != resume_id else None
+
+
+def print_clusters(clusters):
+    for canonical, duplicates in sorted(clusters.items(), key=lambda item: -len(item[1])):
+        print(canonical, "<-", ", ".join(sorted(duplicates)))
+    print("Duplicate clusters -> ", len(clusters), "duplicates -> ", sum(len(d) for d in clusters.values()))
+
+
+if __name__ == "__main__":
+    from constants import RESUME_PATH, JD_PATH, DEDUP_INDEX_FILENAME, DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, \
+        INGEST_WORKERS, INGEST_CHUNK_SIZE
+
+    parser = argparse.ArgumentParser(description="Report near-duplicate resume clusters.")
+    parser.add_argument("command", choices=["report", "scan"])
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        print_clusters(DuplicateDetector.load(DEDUP_INDEX_FILENAME).clusters())
+    else:
+        from directory_reader import DirectoryReader
+        dir_reader = DirectoryReader(JD_PATH, RESUME_PATH, workers=INGEST_WORKERS, chunk_size=INGEST_CHUNK_SIZE)
+        detector = DuplicateDetector(args.threshold, DEDUP_NUM_PERM, DEDUP_BANDS)
+        for file, _, text in dir_reader.read_files(dir_reader.list_resume_files(), dir_reader.read_resume_file):
+            detector.add(file, text)
+        print_clusters(detector.clusters())
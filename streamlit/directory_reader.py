@@ -1,29 +1,171 @@
-import cv2
 from glob import glob
-import numpy as np
-from pdf2image import convert_from_path
-from pypdf import PdfReader
-import pytesseract
 from tqdm import tqdm
 import os
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract'  # Replace with your Tesseract path
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from pdf_backends import DEFAULT_BACKENDS, DEFAULT_MAX_PAGES, DEFAULT_TIMEOUT, PdfExtractionError, \
+    extract_pdf_pages
+from tracing import tracer
+TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract'  # Replace with your Tesseract path
+
+# cv2, numpy, pdf2image and pytesseract are only needed for OCR, so they are imported on first use. Reading the
+# text layer of a PDF, which is all the Streamlit app does on its script thread, never loads them.
+
+
+def load_pytesseract():
+    import pytesseract
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    return pytesseract
+
+
+def get_pdf_page_count(file):
+    from pdf2image import pdfinfo_from_path
+    return pdfinfo_from_path(file)["Pages"]
+
+
+def pages_to_ocr(page_texts, page_images=None):
+    """
+    Returns the zero-based numbers of the pages to OCR: the pages without a text layer, except those that have no
+    images either, since such a page is blank.
+
+    Args:
+        page_texts (list): The text layer of each page.
+        page_images (list, optional): Whether each page has images. None when unknown, so every page without a text
+            layer is OCR'd.
+    """
+    return [i for i, text in enumerate(page_texts) if not text.strip() and (page_images is None or page_images[i])]
+
+
+def file_size(file):
+    """
+    Returns the size in bytes of a file path or an in-memory file such as an upload, or None when it is unknown.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        return os.path.getsize(file) if os.path.exists(file) else None
+    if hasattr(file, "getbuffer"):
+        return file.getbuffer().nbytes
+    return None
 
 class DirectoryReader:
     """
     A class to read and process job description (JD) files and resume files from specified directories.
     """
-    def __init__(self, path_to_jds, path_to_resumes):
+    def __init__(self, path_to_jds, path_to_resumes, workers=1, chunk_size=4, ocr_dpi=200, ocr_workers=2,
+                 deskew_max_side=1000, pdf_backends=DEFAULT_BACKENDS, pdf_timeout=DEFAULT_TIMEOUT,
+                 pdf_max_pages=DEFAULT_MAX_PAGES):
         """
        Initializes the DirectoryReader with paths to job descriptions and resumes.
 
        Args:
            path_to_jds (str): Path to the directory containing job description files.
            path_to_resumes (str): Path to the directory containing resume files.
+           workers (int): Number of processes used to read files. 1 reads files in the current process.
+           chunk_size (int): Number of files handed to a worker process per task.
+           ocr_dpi (int): Resolution at which pages without a text layer are rasterized for OCR.
+           ocr_workers (int): Number of pages of one document OCR'd concurrently.
+           deskew_max_side (int): Longest side of the downsampled image used to estimate skew.
+           pdf_backends (tuple): Text-extraction backends from pdf_backends.BACKENDS, in order of preference.
+           pdf_timeout (float): Seconds allowed to extract the text layer of one PDF.
+           pdf_max_pages (int): Pages beyond this are ignored, for both text extraction and OCR.
        """
         self.path_to_jds = path_to_jds
         self.path_to_resumes = path_to_resumes
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.ocr_dpi = ocr_dpi
+        self.ocr_workers = ocr_workers
+        self.deskew_max_side = deskew_max_side
+        self.pdf_backends = tuple(pdf_backends)
+        self.pdf_timeout = pdf_timeout
+        self.pdf_max_pages = pdf_max_pages
         self.jd_data = {}
         self.resume_data = {}
+        self.errors = {}
+
+    def __getstate__(self):
+        # Worker processes only need the settings, not the text read so far
+        state = self.__dict__.copy()
+        state["jd_data"], state["resume_data"], state["errors"] = {}, {}, {}
+        return state
+
+    def extraction_settings(self):
+        """
+        Returns the settings that affect extracted text. Cached embeddings are invalidated when these change.
+
+        Returns:
+            dict: A JSON-serializable dictionary of extraction settings.
+        """
+        return {"version": 3, "ocr_dpi": self.ocr_dpi, "pdf_backends": list(self.pdf_backends),
+                "pdf_max_pages": self.pdf_max_pages}
+
+    def list_jd_files(self):
+        return glob(self.path_to_jds, recursive=True)
+
+    def list_resume_files(self):
+        return glob(self.path_to_resumes, recursive=True)
+
+    @staticmethod
+    def read_jd_file(file):
+        """
+        Reads a single job description file.
+
+        Args:
+            file (str): Path to the job description file.
+
+        Returns:
+            tuple: The job name and the job description text.
+        """
+        with tracer.span("read_jd_file", bytes=file_size(file)):
+            with open(file, "r", encoding="utf-8") as f:
+                data = f.read()
+        data = data.strip().lower()
+        job_name = file.split("/")[-1].replace(".txt", "")
+        return job_name, data
+
+    @staticmethod
+    def safe_read(read_file, file):
+        try:
+            return file, read_file(file), None
+        except Exception as e:
+            return file, None, f"{type(e).__name__}: {e}"
+
+    def read_files(self, files, read_file, executor=None):
+        """
+        Reads files with read_file, in a process pool when more than one worker is configured.
+
+        Results keep the order of files. A file that fails to read is recorded in the errors attribute and skipped,
+        so one corrupt file does not abort the whole run.
+
+        Args:
+            files (list): Paths of the files to read.
+            read_file (callable): Maps a file path to a (name, text) tuple, e.g. self.read_resume_file.
+            executor (concurrent.futures.Executor, optional): A process pool to read in, for callers that read many
+                batches. By default a pool of self.workers processes is created for this call.
+
+        Returns:
+            list: A list of (file, name, text) tuples for the files that were read successfully.
+        """
+        with tracer.span("read_files", files=len(files)) as span:
+            if executor is not None:
+                results = list(tqdm(executor.map(self.safe_read, repeat(read_file), files, chunksize=self.chunk_size),
+                                    total=len(files)))
+            elif self.workers > 1 and len(files) > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    results = list(tqdm(executor.map(self.safe_read, repeat(read_file), files,
+                                                     chunksize=self.chunk_size), total=len(files)))
+            else:
+                results = [self.safe_read(read_file, file) for file in tqdm(files)]
+
+            output = []
+            for file, result, error in results:
+                if error is not None:
+                    print("Failed to read", file, "->", error)
+                    self.errors[file] = error
+                else:
+                    output.append((file,) + tuple(result))
+            span.set(failed_files=len(results) - len(output))
+        return output
 
     def read_jd_files(self):
         """
@@ -32,78 +174,201 @@ class DirectoryReader:
         Returns:
             dict: A dictionary with job names as keys and the corresponding job descriptions as values.
         """
-        file_list = glob(self.path_to_jds, recursive=True)
-        for file in tqdm(file_list):
-            with open(file, "r", encoding="utf-8") as f:
-                data = f.read()
-                data = data.strip().lower()
-                job_name = file.split("/")[-1].replace(".txt", "")
-                self.jd_data[job_name] = data
+        for _, job_name, data in self.read_files(self.list_jd_files(), self.read_jd_file):
+            self.jd_data[job_name] = data
         return self.jd_data
 
     @staticmethod
     def extract_text_from_pdf(file):
-        reader = PdfReader(file)
-        data = ""
-        for page in reader.pages:
-            data = data + page.extract_text() + "\n"
-        data = data.strip().lower()
-        return data
-
-    def extract_text_from_image(self, file):
-        pages = convert_from_path(file)
-        extracted_text = []
-        for page in pages:
-            # Step 1: Preprocess the image (deskew)
-            preprocessed_image = self.deskew(np.array(page))
-            # Step 2: Extract text using OCR
-            text = self.get_text_from_image(preprocessed_image)
-            extracted_text.append(text)
-        return "\n".join(extracted_text).strip().lower()
+        """
+        Extracts the text layer of a PDF with the default backends (see pdf_backends.extract_pdf_pages).
+
+        Args:
+            file (str or file-like): Path to the PDF, or an uploaded PDF file.
+
+        Returns:
+            str: The extracted text.
+        """
+        with tracer.span("extract_text_from_pdf", bytes=file_size(file)) as span:
+            page_texts = extract_pdf_pages(file).page_texts
+            span.set(pages=len(page_texts))
+        return "\n".join(page_texts).strip().lower()
+
+    def extract_pdf(self, file):
+        """
+        Extracts the text layer of a PDF with this reader's backends, timeout and page cap.
+
+        Returns:
+            PdfText: The page texts, the backend that produced them, the time it took and the pages that have images.
+        """
+        with tracer.span("extract_pdf", bytes=file_size(file)) as span:
+            pdf_text = extract_pdf_pages(file, self.pdf_backends, self.pdf_timeout, self.pdf_max_pages)
+            span.set(pages=len(pdf_text.page_texts), backend=pdf_text.backend)
+        return pdf_text
+
+    def extract_text_from_image(self, file, page_numbers=None):
+        """
+        Extracts text from a PDF with OCR, rasterizing and OCR-ing one page at a time.
+
+        At most ocr_workers pages are held in memory at once, so peak memory does not grow with the page count.
+
+        Args:
+            file (str): Path to the PDF file.
+            page_numbers (list, optional): Zero-based pages to OCR. Defaults to every page.
+
+        Returns:
+            str: The extracted text of the requested pages.
+        """
+        if page_numbers is None:
+            page_numbers = range(min(get_pdf_page_count(file), self.pdf_max_pages))
+        return "\n".join(self.ocr_pages(file, page_numbers)).strip().lower()
+
+    def ocr_pages(self, file, page_numbers, on_page=None):
+        """
+        OCRs the given pages of a PDF, ocr_workers pages at a time.
+
+        Args:
+            file (str): Path to the PDF file.
+            page_numbers (list): Zero-based pages to OCR.
+            on_page (callable, optional): Called as on_page(pages_done, pages_total) after each page.
+
+        Returns:
+            list: The OCR text of each page, in the order of page_numbers.
+        """
+        ocr_page = self.ocr_page
+        if on_page is not None:
+            lock = threading.Lock()
+            pages_done = [0]
+
+            def ocr_page(file, page_number):
+                text = self.ocr_page(file, page_number)
+                with lock:
+                    pages_done[0] += 1
+                    on_page(pages_done[0], len(page_numbers))
+                return text
+
+        if self.ocr_workers > 1 and len(page_numbers) > 1:
+            with ThreadPoolExecutor(max_workers=self.ocr_workers) as executor:
+                return list(executor.map(ocr_page, repeat(file), page_numbers))
+        return [ocr_page(file, page_number) for page_number in page_numbers]
+
+    def ocr_page(self, file, page_number):
+        import numpy as np
+        from pdf2image import convert_from_path
+        with tracer.span("ocr_page", pages=1) as span:
+            try:
+                # Rasterize only this page, then release it as soon as the OCR text is out
+                page = convert_from_path(file, dpi=self.ocr_dpi, first_page=page_number + 1,
+                                         last_page=page_number + 1)[0]
+                # Step 1: Preprocess the image (deskew)
+                preprocessed_image = self.deskew(np.array(page), self.deskew_max_side)
+                # Step 2: Extract text using OCR
+                return self.get_text_from_image(preprocessed_image)
+            except Exception as e:  # one unreadable page must not lose the text of the others
+                print("Failed to OCR page", page_number + 1, "of", file, "->", f"{type(e).__name__}: {e}")
+                span.set_error(e)
+                return ""
+
+    def extract_text_with_ocr_fallback(self, file, on_page=None):
+        """
+        Extracts text page by page, using the text layer where a page has one and OCR where it has none but has
+        images, e.g. a scanned page in an otherwise digital PDF (see pages_to_ocr).
+
+        Args:
+            file (str): Path to the PDF file.
+            on_page (callable, optional): Called as on_page(pages_done, pages_total) after each OCR'd page, and once
+                as on_page(0, pages_total) before OCR starts.
+
+        Returns:
+            str: The extracted text.
+        """
+        with tracer.span("extract_text_with_ocr_fallback", bytes=file_size(file)) as span:
+            try:
+                pdf_text = self.extract_pdf(file)
+                page_texts, page_images = list(pdf_text.page_texts), pdf_text.page_images
+            except PdfExtractionError:  # to solve for incorrect startxref pointer(3), since they are images in pdf
+                page_texts, page_images = [""] * min(get_pdf_page_count(file), self.pdf_max_pages), None
+            ocr_page_numbers = pages_to_ocr(page_texts, page_images)
+            span.set(pages=len(page_texts), ocr_pages=len(ocr_page_numbers))
+            if on_page is not None:
+                on_page(0, len(ocr_page_numbers))
+            for page_number, text in zip(ocr_page_numbers, self.ocr_pages(file, ocr_page_numbers, on_page)):
+                page_texts[page_number] = text
+        return "\n".join(page_texts).strip().lower()
+
+    def read_resume_file(self, file):
+        """
+        Reads a single resume file. Pages of the PDF without a text layer are OCR'd.
+
+        Args:
+            file (str): Path to the resume file, inside a directory named after the job title.
+
+        Returns:
+            tuple: The resume identifier and the resume text.
+        """
+        file_parts = os.path.normpath(file).split(os.sep)
+        # The job title would be the name of the directory just before the file name
+        job_title = file_parts[-2].replace(" ", "_").lower()
+        # The resume name would be the file name without the extension
+        resume_name = os.path.basename(file_parts[-1]).replace("-", "_").lower().replace(".pdf", "")
+        data = self.extract_text_with_ocr_fallback(file)
+        return job_title + "_" + resume_name, data
 
     def read_resume_files(self):
         """
         Reads resume files from the specified directory and stores the content in resume_data attribute.
-        If the resume file is a PDF containing images, OCR is used to extract text.
+        Pages of a resume PDF that contain only images are OCR'd.
 
         Returns:
             dict: A dictionary with resume identifiers as keys and the corresponding resume texts as values.
         """
-        file_list = glob(self.path_to_resumes, recursive=True)
-        for file in tqdm(file_list):
-            file_parts = os.path.normpath(file).split(os.sep)
-            # The job title would be the name of the directory just before the file name
-            job_title = file_parts[-2].replace(" ", "_").lower()      
-            # The resume name would be the file name without the extension
-            resume_name = os.path.basename(file_parts[-1]).replace("-", "_").lower().replace(".pdf", "")   
-            data = self.extract_text_from_pdf(file)
-            if len(data) > 1:
-                self.resume_data[job_title + "_" + resume_name] = data
-            else:  # to solve for incorrect startxref pointer(3), since they are images in pdf
-                self.resume_data[job_title + "_" + resume_name] = self.extract_text_from_image(file)
+        for _, resume_key, data in self.read_files(self.list_resume_files(), self.read_resume_file):
+            self.resume_data[resume_key] = data
         return self.resume_data
 
 
     @staticmethod
-    def deskew(image):
+    def estimate_skew_angle(gray, max_side=1000):
+        """
+       Estimates the skew angle of an inverted grayscale page on a downsampled copy of it.
+
+       Args:
+           gray (numpy.ndarray): The inverted grayscale image (text pixels are non-zero).
+           max_side (int): Longest side of the downsampled copy. The angle does not depend on the scale.
+
+       Returns:
+           float: The rotation angle in degrees that deskews the image.
+       """
+        import cv2
+        import numpy as np
+        scale = max_side / max(gray.shape[:2])
+        if scale < 1:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        coords = np.column_stack(np.where(gray > 0)).astype(np.float32)
+        if len(coords) == 0:
+            return 0.0
+        angle = cv2.minAreaRect(coords)[-1]
+
+        if angle < -45:
+            return -(90 + angle)
+        return -angle
+
+    @staticmethod
+    def deskew(image, max_side=1000):
         """
        Deskews the given image to correct any tilt.
 
        Args:
            image (numpy.ndarray): The image to be deskewed.
+           max_side (int): Longest side of the downsampled copy used to estimate the skew angle.
 
        Returns:
            numpy.ndarray: The deskewed image.
        """
+        import cv2
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         gray = cv2.bitwise_not(gray)
-        coords = np.column_stack(np.where(gray > 0))
-        angle = cv2.minAreaRect(coords)[-1]
-
-        if angle < -45:
-            angle = -(90 + angle)
-        else:
-            angle = -angle
+        angle = DirectoryReader.estimate_skew_angle(gray, max_side)
 
         (h, w) = image.shape[:2]
         center = (w // 2, h // 2)
@@ -122,5 +387,5 @@ class DirectoryReader:
        Returns:
            str: The extracted text.
        """
-        text = pytesseract.image_to_string(image)
+        text = load_pytesseract().image_to_string(image)
         return text
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+
+from embedding_model import EmbeddingModel, get_embedding_model
+
+
+def file_hash(file, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 hash of a file's content.
+
+    Args:
+        file (str): Path to the file.
+        chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Keeps embedding stores in sync with source directories using a manifest of content hashes.
+
+    The manifest maps every source file path to its content hash and document name, together with the
+    embedding model name and the extraction settings. Only new or changed files are re-read and re-embedded,
+    and entries for deleted files are dropped.
+    """
+    def __init__(self, manifest_file, model_name, extraction_settings):
+        """
+        Loads the manifest, discarding it when it was built with another model or other extraction settings.
+
+        Args:
+            manifest_file (str): Path to the JSON manifest.
+            model_name (str): Name of the embedding model.
+            extraction_settings (dict): Settings that affect the extracted text.
+        """
+        self.manifest_file = manifest_file
+        self.model_name = model_name
+        self.extraction_settings = extraction_settings
+        self.manifest = {"model": model_name, "extraction_settings": extraction_settings, "corpora": {}}
+        if os.path.exists(manifest_file):
+            with open(manifest_file, "r", encoding="utf-8") as handle:
+                manifest = json.load(handle)
+            if manifest.get("model") == model_name and manifest.get("extraction_settings") == extraction_settings:
+                self.manifest = manifest
+
+    def sync(self, corpus, files, store_file, read_files, detector=None):
+        """
+        Brings the embedding store for one corpus up to date with the given files.
+
+        Args:
+            corpus (str): Name of the corpus in the manifest, e.g. "jd" or "resume".
+            files (list): Paths of the source files currently in the corpus.
+            store_file (str): Path of the embedding store for the corpus.
+            read_files (callable): Maps a list of file paths to a list of (file, document name, text) tuples.
+                Files missing from the result are treated as unreadable and retried on the next sync.
+            detector (DuplicateDetector, optional): Near-duplicate index of the corpus. A file read here that is a
+                near-duplicate of another file in the corpus reuses that file's embedding instead of being embedded.
+
+        Returns:
+            tuple: The up-to-date embeddings dictionary and a dict of "hits", "misses", "removed" and
+                "duplicates" counts.
+        """
+        entries = self.manifest["corpora"].get(corpus, {})
+        existing = EmbeddingModel.read_embeddings(store_file) if EmbeddingModel.embeddings_exist(store_file) else {}
+
+        content_hashes = {}
+        cached = {}
+        changed_files = []
+        for file in files:
+            content_hashes[file] = file_hash(file)
+            entry = entries.get(file)
+            if entry is not None and entry["content_hash"] == content_hashes[file] and entry["name"] in existing:
+                cached[file] = entry
+            else:
+                changed_files.append(file)
+
+        removed_files = set(entries) - set(files)
+        if detector is not None:
+            for file in removed_files:
+                detector.remove(file)
+
+        to_embed = {}
+        read_entries = {}
+        duplicate_of = {}
+        for file, name, text in (read_files(changed_files) if changed_files else []):
+            read_entries[file] = {"name": name, "content_hash": content_hashes[file]}
+            canonical = detector.add(file, text) if detector is not None else file
+            canonical_entry = read_entries.get(canonical) or cached.get(canonical)
+            if canonical != file and canonical_entry is not None:
+                read_entries[file]["duplicate_of"] = canonical
+                duplicate_of[name] = canonical_entry["name"]
+            else:
+                to_embed[name] = text
+
+        stats = {"hits": len(cached), "misses": len(changed_files), "removed": len(removed_files),
+                 "duplicates": len(duplicate_of)}
+        embedded = get_embedding_model().get_embeddings(to_embed) if to_embed else {}  # BERT loads only if needed
+        new_entries = {}
+        embeddings = {}
+        for file in files:
+            if file in cached:
+                new_entries[file] = cached[file]
+                embeddings[cached[file]["name"]] = existing[cached[file]["name"]]
+            elif file in read_entries:
+                new_entries[file] = read_entries[file]
+                name = read_entries[file]["name"]
+                source = duplicate_of.get(name, name)
+                embeddings[name] = embedded[source] if source in embedded else existing[source]
+
+        if to_embed or stats["removed"] or len(embeddings) != len(existing):
+            EmbeddingModel.save_embeddings(embeddings, store_file)
+        self.manifest["corpora"][corpus] = new_entries
+        self.save_manifest()
+        return embeddings, stats
+
+    def save_manifest(self):
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as handle:
+            json.dump(self.manifest, handle, indent=2)
+        os.replace(tmp_file, self.manifest_file)
@@ -5,38 +5,180 @@ try:
 except RuntimeError:
     asyncio.set_event_loop(asyncio.new_event_loop())
 
-import streamlit as st
-from transformers import BertModel, BertTokenizer
-import pickle, torch
-from constants import EMBEDDING_MODEL_NAME, GEMINI_API_KEY, OUTPUT_PATH
+import os
+import pickle
+from functools import lru_cache
+from constants import EMBEDDING_MODEL_NAME, EMBEDDING_BATCH_SIZE, EMBEDDING_NUM_THREADS, \
+    EMBEDDING_STORE_DTYPE, EMBEDDING_BACKEND, EMBEDDING_ONNX_PATH
+from embedding_store import EmbeddingStore, convert_pickle_store
+from tracing import tracer
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
 
 class EmbeddingModel:
-    def __init__(self):
-        self.tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-        self.model = BertModel.from_pretrained('bert-base-uncased')
+    def __init__(self, batch_size=EMBEDDING_BATCH_SIZE, num_threads=EMBEDDING_NUM_THREADS, backend=EMBEDDING_BACKEND,
+                 model_name=EMBEDDING_MODEL_NAME, onnx_path=EMBEDDING_ONNX_PATH):
+        """
+        Loads the BERT tokenizer and model used to embed documents.
+
+        Args:
+            batch_size (int): Number of documents passed through the model in one forward pass.
+            num_threads (int, optional): Intra-op thread count for torch. Leaves the torch default when None.
+            backend (str): "torch" runs the fp32 model, "torch-int8" dynamically quantizes its linear layers to int8,
+                and "onnx" runs an exported ONNX graph with onnxruntime on the CPU.
+            model_name (str): Hugging Face name of the BERT model.
+            onnx_path (str): Where the ONNX graph is read from, or exported to on first use.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+        # torch and transformers take seconds to import, so they are loaded only when a model is built
+        import torch
+        from transformers import BertModel, BertTokenizer
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.batch_size = batch_size
+        self.backend = backend
+        self.tokenizer = BertTokenizer.from_pretrained(model_name)
+        self.model = BertModel.from_pretrained(model_name)
+        self.model.eval()
+        self.onnx_session = None
+        if backend == "torch-int8":
+            # The linear layers hold most of BERT's compute; activations are quantized on the fly
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif backend == "onnx":
+            self.onnx_session = self.load_onnx_session(onnx_path, num_threads)
+
+    def export_onnx(self, onnx_path):
+        """
+        Exports the model to an ONNX graph with dynamic batch and sequence axes.
+        """
+        import torch
+        sample = self.tokenizer(["export"], return_tensors='pt')
+        input_names = ["input_ids", "attention_mask", "token_type_ids"]
+        torch.onnx.export(self.model, tuple(sample[name] for name in input_names), onnx_path,
+                          input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+                          opset_version=14)
+
+    def load_onnx_session(self, onnx_path, num_threads=None):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnx embedding backend needs onnxruntime (pip install onnxruntime)") from e
+        if not os.path.exists(onnx_path):
+            self.export_onnx(onnx_path)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        return onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    def forward(self, inputs):
+        """
+        Runs the selected backend on a tokenized batch.
+
+        Returns:
+            torch.Tensor: The last hidden state of shape (batch, seq_len, hidden).
+        """
+        if self.onnx_session is None:
+            return self.model(**inputs).last_hidden_state
+        import torch
+        feeds = {node.name: inputs[node.name].numpy() for node in self.onnx_session.get_inputs()}
+        return torch.from_numpy(self.onnx_session.run(["last_hidden_state"], feeds)[0])
+
+    @staticmethod
+    def mean_pooling(last_hidden_state, attention_mask):
+        """
+        Averages token embeddings over the real tokens only, so padding does not change the vectors.
+
+        Args:
+            last_hidden_state (torch.Tensor): Model output of shape (batch, seq_len, hidden).
+            attention_mask (torch.Tensor): Mask of shape (batch, seq_len) with 1 for real tokens.
 
-    def get_embeddings(self, data_dict):
-        output_dict = {}
+        Returns:
+            torch.Tensor: Pooled embeddings of shape (batch, hidden).
+        """
+        mask = attention_mask.unsqueeze(-1).to(last_hidden_state.dtype)
+        summed = (last_hidden_state * mask).sum(dim=1)
+        counts = mask.sum(dim=1).clamp(min=1e-9)
+        return summed / counts
+
+    def get_embeddings(self, data_dict, batch_size=None):
+        """
+        Generates a mean-pooled BERT embedding for every value in data_dict.
+
+        Documents are sorted by token length and embedded in batches so each batch is padded
+        only up to its longest member.
+
+        Args:
+            data_dict (dict): A dictionary of document names to document texts.
+            batch_size (int, optional): Overrides the batch size given at construction.
+
+        Returns:
+            dict: A dictionary of document names to embeddings (list of floats).
+        """
+        batch_size = batch_size or self.batch_size
         keys = list(data_dict.keys())
         values = list(data_dict.values())
+        if not values:
+            return {}
+
+        with tracer.span("get_embeddings", documents=len(values), backend=self.backend) as span:
+            # Sort by token length so each batch holds documents of similar size
+            lengths = [len(ids) for ids in self.tokenizer(values, truncation=True)["input_ids"]]
+            order = sorted(range(len(values)), key=lambda i: lengths[i])
+            span.set(tokens=sum(lengths), batches=-(-len(values) // batch_size))
 
-        # Tokenize and get embeddings
-        with torch.no_grad():
-            for i, value in enumerate(values):
-                inputs = self.tokenizer(value, return_tensors='pt', truncation=True, padding=True)
-                outputs = self.model(**inputs)
-                embeddings = outputs.last_hidden_state.mean(dim=1).squeeze().tolist()
-                output_dict[keys[i]] = embeddings
+            import torch
+            embeddings = [None] * len(values)
+            with torch.no_grad():
+                for start in range(0, len(order), batch_size):
+                    batch_idx = order[start:start + batch_size]
+                    inputs = self.tokenizer([values[i] for i in batch_idx], return_tensors='pt',
+                                            truncation=True, padding=True)
+                    pooled = self.mean_pooling(self.forward(inputs), inputs["attention_mask"])
+                    for i, vector in zip(batch_idx, pooled.tolist()):
+                        embeddings[i] = vector
 
-        return output_dict
+        return {key: embeddings[i] for i, key in enumerate(keys)}
 
     @staticmethod
-    def save_embeddings(embedding, file_name):
-        with open(file_name, 'wb') as handle:
-            pickle.dump(embedding, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    def save_embeddings(embedding, file_name, dtype=EMBEDDING_STORE_DTYPE):
+        """
+        Saves embeddings to disk. Files ending in .pkl are pickled, anything else is written as a binary
+        EmbeddingStore (a versioned .npy matrix plus a key index that names it).
+        """
+        if file_name.endswith('.pkl'):
+            with open(file_name, 'wb') as handle:
+                pickle.dump(embedding, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            EmbeddingStore.save(embedding, file_name, dtype=dtype)
 
     @staticmethod
-    def read_embeddings(file_name): 
-        with open(file_name, 'rb') as handle:
-            output_dict = pickle.load(handle)
-        return output_dict
\ No newline at end of file
+    def embeddings_exist(file_name):
+        return os.path.exists(file_name) if file_name.endswith('.pkl') else EmbeddingStore.exists(file_name)
+
+    @staticmethod
+    def read_embeddings(file_name):
+        """
+        Reads embeddings saved by save_embeddings. Binary stores are memory-mapped and returned as a
+        read-only dict-like EmbeddingStore. Binary stores are not tracked in git, so a missing store is built
+        once from the pickle next to it, e.g. resume_embeddings_large.pkl for resume_embeddings_large.npy.
+        """
+        if file_name.endswith('.pkl'):
+            with open(file_name, 'rb') as handle:
+                output_dict = pickle.load(handle)
+            return output_dict
+        pickle_file = os.path.splitext(file_name)[0] + '.pkl'
+        if not EmbeddingStore.exists(file_name) and os.path.exists(pickle_file):
+            convert_pickle_store(pickle_file, file_name)
+        return EmbeddingStore.load(file_name)
+
+
+@lru_cache(maxsize=None)
+def get_embedding_model():
+    """
+    Returns the process-wide EmbeddingModel, building it on first use.
+    """
+    return EmbeddingModel()
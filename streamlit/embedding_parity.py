@@ -0,0 +1,78 @@
+# Description: Checks an alternative embedding backend (int8 quantized or ONNX) against fp32 embeddings.
+# It embeds the resumes with the fp32 torch model and with the chosen backend, then reports throughput, the cosine
+# drift between the vectors, and how often each resume's top matching JD stays the same. The reference is both a
+# fresh fp32 run on the same text and the fp32 embeddings stored in resume_embeddings_large.pkl.
+# Usage: python embedding_parity.py --backend torch-int8
+import argparse
+import time
+
+import numpy as np
+
+from constants import RESUME_PATH, JD_PATH, JD_EMBEDDINGS_FILENAME, LEGACY_RESUME_EMBEDDINGS_FILENAME, \
+    INGEST_WORKERS, INGEST_CHUNK_SIZE
+from directory_reader import DirectoryReader
+from embedding_model import EmbeddingModel
+from resume_scorer import get_similarity_dict, top_k_indices
+
+
+def time_embeddings(embedding_model, resume_data):
+    start = time.perf_counter()
+    embeddings = embedding_model.get_embeddings(resume_data)
+    return embeddings, len(resume_data) / (time.perf_counter() - start)
+
+
+def cosine_drift(reference, candidate):
+    """
+    Returns the cosine similarity between the reference and candidate vector of every shared key.
+    """
+    keys = [key for key in candidate if key in reference]
+    a = np.asarray([reference[key] for key in keys], dtype=np.float64)
+    b = np.asarray([candidate[key] for key in keys], dtype=np.float64)
+    return np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def top_match_agreement(jd_embeddings, reference, candidate):
+    """
+    Returns the fraction of shared resumes whose top matching JD is the same under both sets of resume vectors.
+    """
+    keys = [key for key in candidate if key in reference]
+    reference_scores = get_similarity_dict(jd_embeddings, {key: reference[key] for key in keys})
+    candidate_scores = get_similarity_dict(jd_embeddings, {key: candidate[key] for key in keys})
+
+    def top_jd(similarity_dict, resume_name):
+        jd_names = list(similarity_dict[resume_name])
+        scores = np.array([similarity_dict[resume_name][jd]["score"] for jd in jd_names])
+        return jd_names[top_k_indices(scores, 1)[0]]
+
+    matches = [top_jd(reference_scores, key) == top_jd(candidate_scores, key) for key in reference_scores]
+    return sum(matches) / len(matches) if matches else float("nan")
+
+
+def print_comparison(label, jd_embeddings, reference, candidate):
+    drift = cosine_drift(reference, candidate)
+    print(f"{label}: {len(drift)} resumes, cosine mean {drift.mean():.5f}, min {drift.min():.5f}, "
+          f"top-JD agreement {top_match_agreement(jd_embeddings, reference, candidate):.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare an embedding backend against fp32 embeddings.")
+    parser.add_argument("--backend", default="torch-int8", choices=["torch-int8", "onnx"])
+    parser.add_argument("--reference", default=LEGACY_RESUME_EMBEDDINGS_FILENAME)
+    parser.add_argument("--limit", type=int, default=None, help="Only embed the first N resumes")
+    args = parser.parse_args()
+
+    dir_reader = DirectoryReader(JD_PATH, RESUME_PATH, workers=INGEST_WORKERS, chunk_size=INGEST_CHUNK_SIZE)
+    resume_data = dir_reader.read_resume_files()
+    if args.limit:
+        resume_data = dict(list(resume_data.items())[:args.limit])
+    jd_embeddings = EmbeddingModel.read_embeddings(JD_EMBEDDINGS_FILENAME)
+    stored = EmbeddingModel.read_embeddings(args.reference)
+
+    fp32_embeddings, fp32_throughput = time_embeddings(EmbeddingModel(backend="torch"), resume_data)
+    candidate_embeddings, candidate_throughput = time_embeddings(EmbeddingModel(backend=args.backend), resume_data)
+
+    print(f"Throughput: torch fp32 {fp32_throughput:.1f} docs/s, {args.backend} {candidate_throughput:.1f} docs/s "
+          f"({candidate_throughput / fp32_throughput:.2f}x)")
+    print_comparison(f"{args.backend} vs fresh fp32", jd_embeddings, fp32_embeddings, candidate_embeddings)
+    print_comparison(f"{args.backend} vs {args.reference}", jd_embeddings, stored, candidate_embeddings)
+    print_comparison(f"fresh fp32 vs {args.reference}", jd_embeddings, stored, fp32_embeddings)
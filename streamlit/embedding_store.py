@@ -0,0 +1,183 @@
+import argparse
+import glob
+import json
+import os
+import pickle
+import time
+from collections.abc import Mapping
+
+import numpy as np
+
+KEYS_SUFFIX = ".keys.json"
+
+
+class EmbeddingStore(Mapping):
+    """
+    A read-only, dict-like view over embeddings stored as one contiguous matrix.
+
+    The matrix lives in a .npy file (float32 or float16) and the row names in a separate key index file,
+    so the store can be opened with np.load(mmap_mode='r') and shared between processes by the OS page cache.
+
+    A store is named by the path of its .npy file, but every save writes the matrix to a new versioned file next to
+    it (jd_embeddings_large.v<ns>.npy) and the key index names the matrix it belongs to. Replacing the key index is
+    the single step that switches readers to the new version, so a reader never pairs a matrix with another
+    version's keys. Stores written before versioning keep their matrix at the store path and are read as before.
+    """
+    def __init__(self, keys, matrix):
+        """
+        Initializes the store from row names and a matrix with one row per name.
+
+        Args:
+            keys (list): Row names, in matrix row order.
+            matrix (numpy.ndarray): A (len(keys), dim) matrix, usually a read-only memmap.
+        """
+        if len(keys) != len(matrix):
+            raise ValueError(f"Key index has {len(keys)} entries but the matrix has {len(matrix)} rows")
+        self.keys_list = list(keys)
+        self.matrix = matrix
+        self.row_index = {key: row for row, key in enumerate(self.keys_list)}
+
+    def __getitem__(self, key):
+        return self.matrix[self.row_index[key]]
+
+    def __iter__(self):
+        return iter(self.keys_list)
+
+    def __len__(self):
+        return len(self.keys_list)
+
+    def as_dict(self):
+        """
+        Returns the embeddings in the legacy format, a dictionary of names to lists of floats.
+        """
+        return {key: self.matrix[row].astype(np.float64).tolist() for row, key in enumerate(self.keys_list)}
+
+    @staticmethod
+    def keys_path(file_name):
+        """
+        Returns the path of the key index file that belongs to a .npy matrix file.
+        """
+        root, _ = os.path.splitext(file_name)
+        return root + KEYS_SUFFIX
+
+    @classmethod
+    def exists(cls, file_name):
+        return os.path.exists(cls.keys_path(file_name))
+
+    @classmethod
+    def read_key_index(cls, file_name):
+        """
+        Returns the row names of a store and the path of the matrix file they belong to.
+        """
+        with open(cls.keys_path(file_name), "r", encoding="utf-8") as handle:
+            index = json.load(handle)
+        if isinstance(index, list):  # written before the matrix was versioned
+            return index, file_name
+        return index["keys"], os.path.join(os.path.dirname(file_name), index["matrix"])
+
+    @staticmethod
+    def save(embeddings, file_name, dtype="float32"):
+        """
+        Writes embeddings as a contiguous matrix plus a key index file.
+
+        Args:
+            embeddings (dict): A dictionary of names to embeddings.
+            file_name (str): Path of the .npy matrix file.
+            dtype (str): Storage dtype, "float32" or "float16".
+        """
+        keys = list(embeddings.keys())
+        matrix = getattr(embeddings, "matrix", None)
+        if matrix is None:
+            matrix = np.asarray([embeddings[key] for key in keys])
+        matrix = np.ascontiguousarray(matrix, dtype=dtype)
+        root, _ = os.path.splitext(file_name)
+        matrix_file = f"{root}.v{time.time_ns()}.npy"
+        with open(matrix_file, "wb") as handle:
+            np.save(handle, matrix)
+        keys_file = EmbeddingStore.keys_path(file_name)
+        previous_matrix_file = EmbeddingStore.read_key_index(file_name)[1] if os.path.exists(keys_file) else None
+        with open(keys_file + ".tmp", "w", encoding="utf-8") as handle:
+            json.dump({"matrix": os.path.basename(matrix_file), "keys": keys}, handle)
+        os.replace(keys_file + ".tmp", keys_file)
+        # Older versions are removed, except the one just replaced, which a reader may be about to open. Readers
+        # that memory-mapped a removed version keep working; where the OS refuses to remove it, it is left behind.
+        for old_file in glob.glob(glob.escape(root) + ".v*.npy") + [file_name]:
+            if old_file not in (matrix_file, previous_matrix_file) and os.path.exists(old_file):
+                try:
+                    os.remove(old_file)
+                except OSError:
+                    pass
+
+    @classmethod
+    def load(cls, file_name, mmap_mode="r"):
+        """
+        Opens a store written by save.
+
+        Args:
+            file_name (str): Path of the .npy matrix file.
+            mmap_mode (str, optional): Passed to np.load. Use None to read the matrix fully into memory.
+
+        Returns:
+            EmbeddingStore: A dict-like view over the stored embeddings.
+        """
+        for attempt in range(3):
+            keys, matrix_file = cls.read_key_index(file_name)
+            try:
+                return cls(keys, np.load(matrix_file, mmap_mode=mmap_mode))
+            except FileNotFoundError:
+                # Two saves happened between reading the key index and opening its matrix; read the new index
+                if attempt == 2:
+                    raise
+
+
+def convert_pickle_store(pickle_file, file_name=None, dtype="float32"):
+    """
+    Converts a pickled dictionary of embeddings into the binary store format.
+
+    Args:
+        pickle_file (str): Path of the .pkl file written by the old EmbeddingModel.save_embeddings.
+        file_name (str, optional): Path of the .npy file to write. Defaults to the pickle path with a .npy extension.
+        dtype (str): Storage dtype, "float32" or "float16".
+
+    Returns:
+        str: Path of the written .npy file.
+    """
+    if file_name is None:
+        file_name = os.path.splitext(pickle_file)[0] + ".npy"
+    with open(pickle_file, "rb") as handle:
+        embeddings = pickle.load(handle)
+    EmbeddingStore.save(embeddings, file_name, dtype=dtype)
+    return file_name
+
+
+def upgrade_legacy_store(file_name):
+    """
+    Rewrites a store whose key index is a plain list of keys, written before the matrix was versioned, so that its
+    key index names a versioned matrix file. The legacy matrix file at the store path is removed.
+
+    Args:
+        file_name (str): Path of the .npy matrix file.
+
+    Returns:
+        bool: True when the store was upgraded, False when it was already versioned.
+    """
+    if EmbeddingStore.read_key_index(file_name)[1] != file_name:
+        return False
+    store = EmbeddingStore.load(file_name, mmap_mode=None)
+    EmbeddingStore.save(store, file_name, dtype=store.matrix.dtype)
+    os.remove(file_name)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert pickled embeddings into memory-mappable .npy stores, or "
+                                                 "upgrade .npy stores with a legacy key index.")
+    parser.add_argument("files", nargs="+", help="Pickled embedding files, e.g. jd_embeddings_large.pkl, or .npy "
+                                                 "stores, e.g. jd_embeddings_large.npy")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    args = parser.parse_args()
+    for file in args.files:
+        if file.endswith(".pkl"):
+            print(file, "->", convert_pickle_store(file, dtype=args.dtype))
+        else:
+            print(file, "->", "upgraded" if upgrade_legacy_store(file) else "already versioned")
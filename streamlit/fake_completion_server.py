@@ -0,0 +1,131 @@
+# Description: A local stand-in for the OpenAI chat completions endpoint, for testing the app offline.
+# It answers every request with a canned completion after an injected delay, and can inject rate-limit and
+# server errors. Streaming requests get the completion as server-sent event chunks, one word at a time.
+# Point the app at it with OPENAI_API_BASE=http://127.0.0.1:<port>/v1
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeCompletionHandler(BaseHTTPRequestHandler):
+    """
+    Handles POST .../chat/completions. Behaviour is read from the server attributes set by start_server.
+    """
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_stream(self, request, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        words = content.split(" ")
+        deltas = [{"role": "assistant"}] + [{"content": word if i == 0 else " " + word} for i, word in enumerate(words)]
+        for i, delta in enumerate(deltas):
+            if i > 1:
+                time.sleep(self.server.chunk_delay)
+            chunk = {
+                "id": f"chatcmpl-fake-{self.server.request_count}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "fake-model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+
+        time.sleep(random.uniform(server.min_latency, server.max_latency))
+        roll = random.random()
+        if roll < server.rate_limit_rate:
+            self.send_json(429, {"error": {"message": "Rate limit reached (injected)", "type": "requests",
+                                           "code": "rate_limit_exceeded"}}, {"Retry-After": "0"})
+            return
+        if roll < server.rate_limit_rate + server.server_error_rate:
+            self.send_json(503, {"error": {"message": "Service unavailable (injected)", "type": "server_error"}})
+            return
+
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        content = f"Fake completion for: {prompt[:80]}"
+        if request.get("stream"):
+            self.send_stream(request, content)
+            return
+        self.send_json(200, {
+            "id": f"chatcmpl-fake-{server.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake-model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(content.split()),
+                      "total_tokens": len(prompt.split()) + len(content.split())},
+        })
+
+
+def start_server(port=0, min_latency=0.0, max_latency=0.0, rate_limit_rate=0.0, server_error_rate=0.0,
+                 chunk_delay=0.0):
+    """
+    Starts the fake completion server on a background thread.
+
+    Args:
+        port (int): Port to listen on. 0 picks a free port.
+        min_latency (float): Minimum seconds added to every response.
+        max_latency (float): Maximum seconds added to every response.
+        rate_limit_rate (float): Fraction of requests answered with HTTP 429.
+        server_error_rate (float): Fraction of requests answered with HTTP 503.
+        chunk_delay (float): Seconds between streamed chunks. min_latency/max_latency apply before the first one.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Its api_base attribute is the value to use for openai.api_base.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeCompletionHandler)
+    server.daemon_threads = True
+    server.min_latency = min_latency
+    server.max_latency = max(min_latency, max_latency)
+    server.rate_limit_rate = rate_limit_rate
+    server.server_error_rate = server_error_rate
+    server.chunk_delay = chunk_delay
+    server.request_count = 0
+    server.lock = threading.Lock()
+    server.api_base = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI chat completions server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--min-latency", type=float, default=0.5)
+    parser.add_argument("--max-latency", type=float, default=2.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--server-error-rate", type=float, default=0.0)
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+    args = parser.parse_args()
+    server = start_server(args.port, args.min_latency, args.max_latency, args.rate_limit_rate, args.server_error_rate,
+                          args.chunk_delay)
+    print("Fake completion server listening, set OPENAI_API_BASE=" + server.api_base)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,165 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from tracing import tracer
+
+# Errors worth retrying: the request itself was fine, the service was busy or unreachable
+RETRYABLE_ERRORS = (openai.error.RateLimitError, openai.error.ServiceUnavailableError,
+                    openai.error.APIConnectionError, openai.error.Timeout)
+
+
+class RateLimiter:
+    """
+    A client-side token-bucket rate limiter, shared by every thread in the process.
+
+    Up to burst requests may go out at once, e.g. every section of a report, and the bucket refills at the
+    configured rate, so sustained traffic stays within it.
+    """
+    def __init__(self, requests_per_minute, burst=1):
+        """
+        Args:
+            requests_per_minute (float): Maximum sustained request rate. 0 or None disables the limiter.
+            burst (int): Bucket capacity, the number of requests that may be sent back to back.
+        """
+        self.rate = requests_per_minute / 60.0 if requests_per_minute else 0.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until the caller may send the next request.
+        """
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Take a token even when none is left; waiting callers queue up in order as the debt is repaid
+            self.tokens -= 1
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+def backoff_delay(attempt, error=None, base=1.0, cap=30.0):
+    """
+    Returns the seconds to wait before retry number attempt (0-based), with full jitter.
+
+    A Retry-After header on the error is honoured as a lower bound.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    retry_after = (getattr(error, "headers", None) or {}).get("retry-after")
+    try:
+        return max(delay, float(retry_after))
+    except (TypeError, ValueError):
+        return delay
+
+
+def chat_completion(messages, model, temperature=0.0, rate_limiter=None, max_retries=5):
+    """
+    Sends a chat completion request, retrying with jittered exponential backoff on rate-limit and transient errors.
+
+    Args:
+        messages (list): Chat messages in the OpenAI format.
+        model (str): Name of the chat model.
+        temperature (float): Sampling temperature.
+        rate_limiter (RateLimiter, optional): Limiter acquired before every attempt.
+        max_retries (int): Number of retries after the first attempt.
+
+    Returns:
+        str: The content of the first choice.
+    """
+    with tracer.span("chat_completion", model=model) as span:
+        for attempt in range(max_retries + 1):
+            span.set(retries=attempt)
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            try:
+                response = openai.ChatCompletion.create(model=model, messages=messages, temperature=temperature)
+                usage = response.get("usage") or {}
+                span.set(prompt_tokens=usage.get("prompt_tokens", 0),
+                         completion_tokens=usage.get("completion_tokens", 0))
+                return response.choices[0].message["content"]
+            except RETRYABLE_ERRORS as e:
+                if attempt == max_retries:
+                    raise
+                time.sleep(backoff_delay(attempt, e))
+
+
+def stream_chat_completion(messages, model, temperature=0.0, rate_limiter=None, max_retries=5):
+    """
+    Sends a streaming chat completion request and yields the content of each chunk as it arrives.
+
+    Rate-limit and transient errors are retried like chat_completion, but only while opening the stream. An error
+    after the first chunk is raised to the caller.
+
+    Args:
+        messages (list): Chat messages in the OpenAI format.
+        model (str): Name of the chat model.
+        temperature (float): Sampling temperature.
+        rate_limiter (RateLimiter, optional): Limiter acquired before every attempt.
+        max_retries (int): Number of retries after the first attempt.
+
+    Yields:
+        str: Pieces of the completion text, in order.
+    """
+    for attempt in range(max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            chunks = openai.ChatCompletion.create(model=model, messages=messages, temperature=temperature,
+                                                  stream=True)
+            break
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff_delay(attempt, e))
+    for chunk in chunks:
+        if not chunk.choices:
+            continue
+        content = chunk.choices[0].get("delta", {}).get("content")
+        if content:
+            yield content
+
+
+def imap_concurrently(function, items, max_workers):
+    """
+    Like map_concurrently, but yields each result as soon as it and every result before it are ready.
+
+    Args:
+        function (callable): Function applied to each item.
+        items (list): Inputs.
+        max_workers (int): Maximum number of calls in flight at once.
+
+    Yields:
+        The results, in the order of items.
+    """
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        for item in items:
+            yield function(item)
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(function, items)
+
+
+def map_concurrently(function, items, max_workers):
+    """
+    Applies function to every item on a thread pool and returns the results in the order of items.
+
+    Args:
+        function (callable): Function applied to each item.
+        items (list): Inputs.
+        max_workers (int): Maximum number of calls in flight at once.
+
+    Returns:
+        list: The results, in the order of items.
+    """
+    return list(imap_concurrently(function, items, max_workers))
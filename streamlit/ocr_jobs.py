@@ -0,0 +1,156 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """
+    Raised when an OCR job is submitted while every worker is busy and the queue of waiting jobs is full.
+    """
+
+
+class OcrJob:
+    """
+    The state of one OCR job. Workers update it in place; readers only look at it.
+    """
+    def __init__(self, job_id, content_hash):
+        self.job_id = job_id
+        self.content_hash = content_hash
+        self.state = "queued"  # queued -> running -> done | failed
+        self.pages_done = 0
+        self.pages_total = None
+        self.text = None
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+
+    @property
+    def is_finished(self):
+        return self.state in ("done", "failed")
+
+    def progress(self):
+        """
+        Returns the fraction of pages OCR'd so far, between 0 and 1.
+        """
+        if self.is_finished:
+            return 1.0
+        if not self.pages_total:
+            return 0.0
+        return self.pages_done / self.pages_total
+
+
+class OcrJobQueue:
+    """
+    A bounded pool of background workers that extract uploaded PDFs with the OCR fallback.
+
+    One instance is meant to be shared by every session in the server process. Jobs for the same file content are
+    merged, finished texts are kept in a shared LRU cache keyed by content hash, and submissions beyond the workers
+    plus max_pending waiting jobs are refused, so the time a job can wait stays bounded under load.
+    """
+    def __init__(self, dir_reader, max_workers=2, max_pending=8, max_results=100):
+        """
+        Args:
+            dir_reader (DirectoryReader): Reader whose extract_text_with_ocr_fallback does the work.
+            max_workers (int): Number of documents extracted at once.
+            max_pending (int): Number of jobs allowed to wait for a worker.
+            max_results (int): Number of extracted texts, and finished jobs, kept.
+        """
+        self.dir_reader = dir_reader
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_results = max_results
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-job")
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self.results = OrderedDict()
+        self.next_id = 0
+
+    @staticmethod
+    def content_hash(file_bytes):
+        return hashlib.sha256(file_bytes).hexdigest()
+
+    def cached_text(self, content_hash):
+        with self.lock:
+            if content_hash in self.results:
+                self.results.move_to_end(content_hash)
+                return self.results[content_hash]
+            return None
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def unfinished_count(self):
+        return sum(not job.is_finished for job in self.jobs.values())
+
+    def submit(self, file_bytes):
+        """
+        Queues a PDF for extraction, or returns the job already extracting or holding the same content.
+
+        Args:
+            file_bytes (bytes): The uploaded PDF.
+
+        Returns:
+            OcrJob: The job. Its job_id is what a session keeps to poll it.
+
+        Raises:
+            QueueFullError: When every worker is busy and max_pending jobs are already waiting.
+        """
+        content_hash = self.content_hash(file_bytes)
+        with self.lock:
+            for job in reversed(self.jobs.values()):
+                if job.content_hash == content_hash and job.state != "failed":
+                    return job
+            if self.unfinished_count() >= self.max_workers + self.max_pending:
+                raise QueueFullError(f"{self.unfinished_count()} documents are already being OCR'd or waiting")
+            self.next_id += 1
+            job = OcrJob(f"ocr-{self.next_id}", content_hash)
+            if content_hash in self.results:
+                job.text, job.state, job.finished = self.results[content_hash], "done", time.time()
+            else:
+                self.executor.submit(self.run, job, file_bytes)
+            self.jobs[job.job_id] = job
+            self.prune()
+        return job
+
+    def prune(self):
+        # Forget the oldest finished jobs and texts beyond max_results. Unfinished jobs are always kept.
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished]
+        for job_id in finished[:max(len(finished) - self.max_results, 0)]:
+            del self.jobs[job_id]
+        while len(self.results) > self.max_results:
+            self.results.popitem(last=False)
+
+    def run(self, job, file_bytes):
+        job.state = "running"
+
+        def on_page(pages_done, pages_total):
+            job.pages_done, job.pages_total = pages_done, pages_total
+
+        # pdf2image needs a path, so the upload is spooled to a temporary file for the duration of the job
+        handle, path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            with os.fdopen(handle, "wb") as pdf_file:
+                pdf_file.write(file_bytes)
+            job.text = self.dir_reader.extract_text_with_ocr_fallback(path, on_page)
+            job.state = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.state = "failed"
+        finally:
+            os.remove(path)
+            job.finished = time.time()
+        with self.lock:
+            if job.state == "done":
+                self.results[job.content_hash] = job.text
+            self.prune()
+
+    def get_stats(self):
+        with self.lock:
+            return {"running": sum(job.state == "running" for job in self.jobs.values()),
+                    "queued": sum(job.state == "queued" for job in self.jobs.values()),
+                    "cached": len(self.results)}
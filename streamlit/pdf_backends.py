@@ -0,0 +1,226 @@
+import atexit
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import namedtuple
+
+# Result of extract_pdf_pages: the text of each page, the backend that produced it, the time it took, and whether
+# each page has images, e.g. a scan, or None when the backend cannot tell
+PdfText = namedtuple("PdfText", ["page_texts", "backend", "seconds", "page_images"])
+
+DEFAULT_BACKENDS = ("pypdfium2", "pypdf", "pdfminer")
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_PAGES = 50
+
+
+class PdfExtractionError(Exception):
+    """
+    Raised when no backend could extract text from a PDF within its time limit.
+    """
+
+
+class BackendError(Exception):
+    """
+    Raised in the caller when a backend failed on a document, or its extraction process died.
+    """
+
+
+def extract_pages_pypdfium2(source, max_pages):
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+    pdf = pdfium.PdfDocument(source)
+    try:
+        page_texts = []
+        page_images = []
+        for i in range(min(len(pdf), max_pages)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            page_texts.append(textpage.get_text_bounded().replace("\r\n", "\n"))
+            page_images.append(next(page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE]), None) is not None)
+            textpage.close()
+            page.close()
+        return page_texts, page_images
+    finally:
+        pdf.close()
+
+
+def extract_pages_pypdf(source, max_pages):
+    from pypdf import PdfReader
+    pages = PdfReader(source).pages[:max_pages]
+    # Counting a page's images lists them without decoding any
+    return [page.extract_text() or "" for page in pages], [len(page.images) > 0 for page in pages]
+
+
+def extract_pages_pdfminer(source, max_pages):
+    from pdfminer.high_level import extract_text
+    # pdfminer ends every page with a form feed
+    page_texts = extract_text(source, maxpages=max_pages).split("\x0c")
+    if page_texts and not page_texts[-1].strip():
+        page_texts.pop()
+    return page_texts, None
+
+
+# Each backend returns the text of every page and whether each page has images, or None when it cannot tell
+BACKENDS = {
+    "pypdfium2": extract_pages_pypdfium2,
+    "pypdf": extract_pages_pypdf,
+    "pdfminer": extract_pages_pdfminer,
+}
+
+
+def serve_extractions(connection):
+    # Runs in an extraction process: extracts one PDF per request until the parent closes the pipe
+    while True:
+        try:
+            name, source, max_pages = connection.recv()
+        except EOFError:
+            return
+        try:
+            if isinstance(source, bytes):
+                source = io.BytesIO(source)
+            connection.send((True, BACKENDS[name](source, max_pages)))
+        except Exception as e:
+            connection.send((False, f"{type(e).__name__}: {e}"))
+
+
+class ExtractionProcess:
+    """
+    A child process that runs PDF backends, one document at a time, and can be killed when one takes too long.
+    """
+    def __init__(self, context):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=serve_extractions, args=(child_connection,), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def extract(self, name, source, max_pages, timeout):
+        try:
+            self.connection.send((name, source, max_pages))
+            ready = self.connection.poll(timeout)
+            if ready:
+                ok, result = self.connection.recv()
+        except (OSError, EOFError):  # the process died, e.g. a backend crashed on the document
+            self.kill()
+            raise BackendError(f"the extraction process exited with code {self.process.exitcode}") from None
+        if not ready:
+            raise TimeoutError(f"timed out after {timeout:.1f}s")
+        if not ok:
+            raise BackendError(result)
+        return result
+
+    def kill(self):
+        self.connection.close()
+        self.process.kill()
+        self.process.join()
+
+    def close(self):
+        self.connection.close()  # the child exits when it sees the pipe close
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+
+
+class ExtractionPool:
+    """
+    Extraction processes shared by every thread of this process.
+
+    Each call checks out an idle process, or starts one, so concurrent callers never share a process and PDFium,
+    which is not thread-safe, only ever runs on one thread per process. A process whose call timed out or crashed
+    is killed instead of being returned, so a stuck PDF cannot keep a worker or the interpreter's exit waiting.
+    Processes are spawned rather than forked, since the callers are often multi-threaded.
+    """
+    def __init__(self, max_idle=4):
+        self.max_idle = max_idle
+        self.context = multiprocessing.get_context("spawn")
+        self.lock = threading.Lock()
+        self.idle = []
+
+    def extract(self, name, source, max_pages, timeout):
+        with self.lock:
+            process = self.idle.pop() if self.idle else None
+        if process is not None and not process.process.is_alive():
+            process.kill()
+            process = None
+        if process is None:
+            process = ExtractionProcess(self.context)
+        try:
+            result = process.extract(name, source, max_pages, timeout)
+        except BackendError:
+            if process.process.is_alive():  # the backend raised; the process is fine
+                self.release(process)
+            else:
+                process.kill()
+            raise
+        except BaseException:
+            process.kill()
+            raise
+        self.release(process)
+        return result
+
+    def release(self, process):
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(process)
+                return
+        process.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for process in idle:
+            process.close()
+
+    def forget(self):
+        # A forked child must not use, or close, the extraction processes of its parent
+        self.idle = []
+        self.lock = threading.Lock()
+
+
+extraction_pool = ExtractionPool()
+atexit.register(extraction_pool.close)
+os.register_at_fork(after_in_child=extraction_pool.forget)
+
+
+def extract_pdf_pages(file, backends=DEFAULT_BACKENDS, timeout=DEFAULT_TIMEOUT, max_pages=DEFAULT_MAX_PAGES):
+    """
+    Extracts the text layer of a PDF page by page, trying each backend in turn until one succeeds.
+
+    Args:
+        file (str or file-like): Path to the PDF, or an open binary file such as a Streamlit upload.
+        backends (tuple): Names of backends from BACKENDS, in order of preference.
+        timeout (float): Seconds allowed for the document, shared by the backends tried on it. A backend that fails
+            leaves the remaining time to the next one; a backend still running at the deadline is killed.
+        max_pages (int): Only the first max_pages pages are read.
+
+    Returns:
+        PdfText: The page texts together with the backend that produced them, the time it took and the pages that
+            have images.
+
+    Raises:
+        PdfExtractionError: If every backend failed or the time limit was reached.
+    """
+    if hasattr(file, "read"):
+        # Uploads are sent to the extraction process as bytes
+        if hasattr(file, "seek"):
+            file.seek(0)
+        source = file.read()
+    else:
+        source = os.fspath(file)
+
+    deadline = time.monotonic() + timeout
+    errors = []
+    for name in backends:
+        start = time.perf_counter()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            errors.append(f"{name}: not tried, the {timeout}s limit for the document was reached")
+            break
+        try:
+            page_texts, page_images = extraction_pool.extract(name, source, max_pages, remaining)
+        except (BackendError, TimeoutError) as e:
+            errors.append(f"{name}: {e}")
+            continue
+        return PdfText(page_texts, name, time.perf_counter() - start, page_images)
+    raise PdfExtractionError("; ".join(errors))
@@ -0,0 +1,157 @@
+import logging
+import re
+from functools import lru_cache
+
+import tiktoken
+
+from constants import comparison_reference_prompt, resume_analysis_reference_prompt, \
+    job_description_analysis_reference_prompt, gap_analysis_reference_prompt, actionable_steps_reference_prompt, \
+    experience_enhancement_reference_prompt, additional_qualifications_reference_prompt, \
+    resume_tailoring_reference_prompt, relevant_skills_highlight_reference_prompt, resume_formatting_reference_prompt, \
+    resume_length_reference_prompt
+
+logger = logging.getLogger(__name__)
+
+SECTION_BREAK = re.compile(r"\n\s*\n")
+
+
+class ApproximateEncoding:
+    """
+    Stand-in for a tiktoken encoding when the real one cannot be loaded (tiktoken downloads it on first use).
+    Each "token" is a word with its trailing whitespace, so counts run somewhat low.
+    """
+    name = "approximate"
+    pattern = re.compile(r"\S+\s*|\s+")
+
+    def encode(self, text):
+        return self.pattern.findall(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("Could not load the tiktoken encoding for %s, counting words instead: %s", model, e)
+        return ApproximateEncoding()
+
+
+def count_tokens(text, model):
+    """
+    Counts the tokens of text with the tokenizer of the given model.
+    """
+    return len(get_encoding(model).encode(text or ""))
+
+
+def count_message_tokens(messages, model):
+    """
+    Counts the input tokens of a list of chat messages, including the few tokens of framing each message adds.
+    """
+    return sum(count_tokens(message["content"], model) + 4 for message in messages) + 3
+
+
+def truncate_to_tokens(text, max_tokens, model):
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]).rstrip() + " ..."
+
+
+@lru_cache(maxsize=256)
+def compact_document(text, token_budget, model):
+    """
+    Compacts a document to at most token_budget tokens by keeping the start of every section.
+
+    Sections are blocks separated by blank lines. Each section keeps an equal share of the budget, and the share
+    left unused by short sections is handed on to longer ones, so headings and the opening lines of every section
+    survive. Documents within the budget are returned unchanged. Results are cached per text and budget.
+
+    Args:
+        text (str): The document text.
+        token_budget (int): Maximum number of tokens to keep.
+        model (str): Model whose tokenizer counts the tokens.
+
+    Returns:
+        str: The document, or a digest of its sections when it exceeds the budget.
+    """
+    if not text or count_tokens(text, model) <= token_budget:
+        return text
+    sections = [section.strip() for section in SECTION_BREAK.split(text) if section.strip()]
+    section_tokens = [count_tokens(section, model) for section in sections]
+
+    digests = [None] * len(sections)
+    remaining_budget = token_budget
+    # Short sections first, so whatever they leave of their share goes to the longer ones
+    order = sorted(range(len(sections)), key=lambda i: section_tokens[i])
+    for position, i in enumerate(order):
+        share = max(remaining_budget // (len(order) - position), 0)
+        if share == 0:
+            break
+        digests[i] = truncate_to_tokens(sections[i], share, model)
+        remaining_budget -= min(section_tokens[i], share)
+    digest = "\n\n".join(digest for digest in digests if digest)
+    # The separators and the " ..." of every cut section cost a few tokens more, so the digest is trimmed to fit.
+    # A cut can re-encode to more tokens, e.g. inside a multi-byte character, hence the loop.
+    encoding = get_encoding(model)
+    keep = token_budget
+    while keep > 0 and count_tokens(digest, model) > token_budget:
+        digest = encoding.decode(encoding.encode(digest)[:keep]).rstrip()
+        keep -= 1
+    return digest
+
+
+def build_system_prompt(instructions, resume_text, jd_text, model, resume_budget, jd_budget):
+    """
+    Builds the system message that carries the resume and the job description, each exactly once.
+
+    Args:
+        instructions (str): The reviewer instructions, e.g. TEMPLATE_CONTENT.
+        resume_text (str): The resume text.
+        jd_text (str): The job description text.
+        model (str): Model whose tokenizer counts the tokens.
+        resume_budget (int): Token budget for the resume before it is compacted.
+        jd_budget (int): Token budget for the job description before it is compacted.
+
+    Returns:
+        str: The system prompt.
+    """
+    resume_text = compact_document(resume_text, resume_budget, model)
+    jd_text = compact_document(jd_text, jd_budget, model)
+    return "\n\n" + instructions + "<RESUME STARTS HERE> {}. <RESUME ENDS HERE> with the job description: " \
+        "<JOB DESCRIPTION STARTS HERE> {}.<JOB DESCRIPTION ENDS HERE>\n\nBe crisp and clear in response. DO NOT " \
+        "provide the resume and job description in the response\n\n".format(resume_text, jd_text)
+
+
+def build_report_sections():
+    """
+    Returns the sections of the detailed report as (title, template name, prompt) tuples, in report order.
+    """
+    return [
+        ("Comparison Analysis", "comparison_prompt", comparison_reference_prompt),
+        ("Resume Analysis", "resume_analysis_prompt", resume_analysis_reference_prompt),
+        ("Job Description Analysis", "job_description_analysis_prompt", job_description_analysis_reference_prompt),
+        ("Gap Analysis", "gap_analysis_prompt", gap_analysis_reference_prompt),
+        ("Actionable Steps", "actionable_steps_prompt", actionable_steps_reference_prompt),
+        ("Experience Enhancement", "experience_enhancement_prompt", experience_enhancement_reference_prompt),
+        ("Additional Qualifications", "additional_qualifications_prompt", additional_qualifications_reference_prompt),
+        ("Resume Tailoring", "resume_tailoring_prompt", resume_tailoring_reference_prompt),
+        ("Relevant Skills Highlight", "relevant_skills_highlight_prompt", relevant_skills_highlight_reference_prompt),
+        ("Resume Formatting", "resume_formatting_prompt", resume_formatting_reference_prompt),
+        ("Resume Length", "resume_length_prompt", resume_length_reference_prompt),
+    ]
+
+
+def log_request_tokens(template_name, messages, model):
+    """
+    Logs the number of input tokens of a request and returns it.
+    """
+    input_tokens = count_message_tokens(messages, model)
+    logger.info("LLM request %s: %d input tokens", template_name, input_tokens)
+    return input_tokens
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def text_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    A disk-backed cache of LLM responses stored in SQLite, with LRU eviction, a TTL and an entry cap.
+
+    One instance is meant to be shared by every session in the server process. It is safe to use from several
+    threads at once.
+    """
+    def __init__(self, path, max_entries=10000, ttl_seconds=7 * 24 * 3600):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            path (str): Path to the SQLite file.
+            max_entries (int): Least recently used entries beyond this count are evicted.
+            ttl_seconds (float): Entries older than this are treated as misses and evicted.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, template TEXT, model TEXT, response TEXT, created REAL, last_access REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    @staticmethod
+    def make_key(template_name, messages, resume_text, jd_text, model, temperature):
+        """
+        Builds the cache key for a request.
+
+        The key covers the template name, hashes of the resume and the job description, the model and the
+        temperature, plus a hash of the exact messages so edits to prompt wording never serve stale responses.
+
+        Returns:
+            str: A hex digest identifying the request.
+        """
+        parts = {
+            "template": template_name,
+            "resume": text_hash(resume_text),
+            "jd": text_hash(jd_text),
+            "model": model,
+            "temperature": temperature,
+            "messages": text_hash(json.dumps(messages, sort_keys=True)),
+        }
+        return text_hash(json.dumps(parts, sort_keys=True))
+
+    def get(self, key):
+        """
+        Returns the cached response for key, or None on a miss.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.stats["misses"] += 1
+                return None
+            self.connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+            return row[0]
+
+    def put(self, key, response, template_name="", model=""):
+        """
+        Stores a response, then evicts expired and least recently used entries beyond the cap.
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, template, model, response, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (key, template_name, model, response, now, now)
+            )
+            evicted = self.connection.execute("DELETE FROM responses WHERE created < ?",
+                                              (now - self.ttl_seconds,)).rowcount
+            evicted += self.connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            ).rowcount
+            self.stats["evictions"] += evicted
+
+    def get_stats(self):
+        """
+        Returns the hit, miss and eviction counts of this process together with the current number of entries.
+        """
+        with self.lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return dict(self.stats, entries=entries)
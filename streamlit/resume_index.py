@@ -0,0 +1,371 @@
+# Description: A persistent vector index over resume embeddings for "best candidates for this JD" queries.
+# Small pools are searched exactly; large pools use an inverted-file (IVF) index built with spherical k-means, which
+# only scans the resumes in the clusters closest to the query. Once built, the index is kept up to date by
+# resume_scorer.create_embeddings, which inserts and deletes the resumes that changed instead of rebuilding it.
+# Usage:
+#   python resume_index.py build
+#   python resume_index.py query de1_ola --k 50 --same-category
+#   python resume_index.py report --k 10
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from constants import JD_EMBEDDINGS_FILENAME, RESUME_EMBEDDINGS_FILENAME, RESUME_INDEX_PATH
+from embedding_model import EmbeddingModel
+from resume_scorer import RESUME_JD_COMBI_TO_MATCH, RESUME_PATTERN, get_jd_basename, get_jd_category, top_k_indices
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def embedding_matrix(embeddings):
+    """
+    Returns the names of a dictionary (or EmbeddingStore) of embeddings and a matrix with one row per name.
+    """
+    keys = list(embeddings.keys())
+    matrix = getattr(embeddings, "matrix", None)
+    return keys, np.asarray(matrix if matrix is not None else [embeddings[key] for key in keys])
+
+
+def assign_to_centroids(vectors, centroids, batch_size=4096):
+    """
+    Returns the index of the most similar centroid for every vector, working in batches to bound memory.
+    """
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        assignments[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    return assignments
+
+
+def train_kmeans(vectors, nlist, iterations=10, seed=0):
+    """
+    Clusters unit vectors with spherical k-means.
+
+    Args:
+        vectors (numpy.ndarray): Unit-norm training vectors.
+        nlist (int): Number of clusters.
+        iterations (int): Number of assignment/update rounds.
+        seed (int): Seed for the initial centroids.
+
+    Returns:
+        numpy.ndarray: A (nlist, dim) matrix of unit-norm centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_to_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = np.linalg.norm(sums, axis=1) == 0
+        # Re-seed empty clusters with random vectors so every list stays in use
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+class ResumeIndex:
+    """
+    A vector index over resumes that supports inserts, deletes, category filters, and exact or IVF search.
+    """
+    def __init__(self, dim, exact_threshold=20000):
+        """
+        Args:
+            dim (int): Embedding dimension.
+            exact_threshold (int): In "auto" mode, pools smaller than this are searched exactly.
+        """
+        self.dim = dim
+        self.exact_threshold = exact_threshold
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.size = 0
+        self.keys = []
+        self.categories = []
+        self.alive = np.empty(0, dtype=bool)
+        # Categories are stored as integer codes per row so filters are a vectorized lookup
+        self.category_codes = np.empty(0, dtype=np.int64)
+        self.category_ids = {}
+        self.row_of = {}
+        self.centroids = None
+        self.lists = []
+
+    @classmethod
+    def from_embeddings(cls, embeddings, categories=None, **kwargs):
+        """
+        Builds an index from a dictionary (or EmbeddingStore) of resume names to embeddings.
+
+        Args:
+            embeddings (dict): Resume names to embeddings.
+            categories (dict, optional): Resume names to categories. Defaults to the job title in the resume name.
+        """
+        keys, matrix = embedding_matrix(embeddings)
+        index = cls(matrix.shape[1], **kwargs)
+        index.add_many(keys, matrix, [categories[key] for key in keys] if categories else None)
+        return index
+
+    @staticmethod
+    def default_category(key):
+        # "data_engineer_resume_40" -> "data_engineer"
+        return RESUME_PATTERN.sub('', key)
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def add_many(self, keys, vectors, categories=None):
+        """
+        Inserts resumes, replacing any that are already indexed under the same key.
+
+        Args:
+            keys (list): Resume names.
+            vectors (numpy.ndarray): One embedding per key.
+            categories (list, optional): One category per key. Defaults to the job title in the resume name.
+        """
+        vectors = normalize(vectors).reshape(-1, self.dim)
+        if categories is None:
+            categories = [self.default_category(key) for key in keys]
+        for key in keys:
+            if key in self.row_of:
+                self.remove(key)
+
+        needed = self.size + len(keys)
+        if needed > len(self.vectors):
+            # Grow geometrically so repeated single inserts stay cheap
+            capacity = max(needed, 2 * len(self.vectors), 1024)
+            self.vectors = np.concatenate([self.vectors[:self.size],
+                                           np.empty((capacity - self.size, self.dim), dtype=np.float32)])
+            self.alive = np.concatenate([self.alive[:self.size], np.zeros(capacity - self.size, dtype=bool)])
+            self.category_codes = np.concatenate([self.category_codes[:self.size],
+                                                  np.zeros(capacity - self.size, dtype=np.int64)])
+        rows = np.arange(self.size, needed)
+        self.vectors[rows] = vectors
+        self.alive[rows] = True
+        self.size = needed
+        for row, key, category in zip(rows, keys, categories):
+            self.category_codes[row] = self.category_ids.setdefault(category, len(self.category_ids))
+            self.keys.append(key)
+            self.categories.append(category)
+            self.row_of[key] = int(row)
+        if self.centroids is not None:
+            for row, list_id in zip(rows, assign_to_centroids(vectors, self.centroids)):
+                self.lists[list_id].append(int(row))
+
+    def add(self, key, vector, category=None):
+        self.add_many([key], np.asarray(vector)[None, :], None if category is None else [category])
+
+    def remove(self, key):
+        """
+        Deletes a resume. Its row is only marked dead; save() compacts the index.
+        """
+        row = self.row_of.pop(key)
+        self.alive[row] = False
+
+    def sync(self, embeddings):
+        """
+        Brings the index up to date with a resume embedding store without rebuilding it. Resumes missing from the
+        store are deleted, and new resumes and resumes whose embedding changed are inserted into the existing IVF
+        lists.
+
+        Args:
+            embeddings (dict): Resume names to embeddings, e.g. the EmbeddingStore the index was built from.
+
+        Returns:
+            dict: "added", "updated" and "removed" counts.
+        """
+        keys, matrix = embedding_matrix(embeddings)
+        wanted = set(keys)
+        removed = [key for key in self.row_of if key not in wanted]
+        for key in removed:
+            self.remove(key)
+        vectors = normalize(matrix).reshape(-1, self.dim)
+        known = [i for i, key in enumerate(keys) if key in self.row_of]
+        drift = np.abs(self.vectors[[self.row_of[keys[i]] for i in known]] - vectors[known]).max(axis=1, initial=0)
+        updated = [i for i, change in zip(known, drift) if change > 1e-6]
+        added = [i for i, key in enumerate(keys) if key not in self.row_of]
+        if added or updated:
+            rows = added + updated
+            self.add_many([keys[i] for i in rows], vectors[rows])
+        return {"added": len(added), "updated": len(updated), "removed": len(removed)}
+
+    def train(self, nlist=None, iterations=10, max_training_vectors=None):
+        """
+        Builds the IVF lists with spherical k-means.
+
+        Args:
+            nlist (int, optional): Number of lists. Defaults to about the square root of the pool size.
+            iterations (int): k-means iterations.
+            max_training_vectors (int, optional): Train on a random sample of this size. Defaults to 256 per list.
+        """
+        rows = np.flatnonzero(self.alive[:self.size])
+        nlist = min(nlist or max(1, int(np.sqrt(len(rows)))), len(rows))
+        max_training_vectors = max_training_vectors or 256 * nlist
+        sample = rows
+        if len(rows) > max_training_vectors:
+            sample = np.random.default_rng(0).choice(rows, max_training_vectors, replace=False)
+        self.centroids = train_kmeans(self.vectors[sample], nlist, iterations)
+        self.lists = [[] for _ in range(nlist)]
+        for row, list_id in zip(rows, assign_to_centroids(self.vectors[rows], self.centroids)):
+            self.lists[list_id].append(int(row))
+
+    def candidate_rows(self, query, mode, nprobe):
+        """
+        Returns the rows to score, or None to score every row.
+        """
+        if mode == "auto":
+            mode = "ivf" if self.centroids is not None and len(self) >= self.exact_threshold else "exact"
+        if mode == "exact":
+            return None
+        if self.centroids is None:
+            raise ValueError("The IVF index is not trained, call train() first")
+        probes = top_k_indices(self.centroids @ query, nprobe)
+        return np.fromiter((row for list_id in probes for row in self.lists[list_id]), dtype=np.int64)
+
+    def search(self, query, k=50, categories=None, mode="auto", nprobe=8):
+        """
+        Finds the resumes most similar to a query embedding.
+
+        Args:
+            query (numpy.ndarray): A JD embedding.
+            k (int): Number of resumes to return.
+            categories (iterable, optional): Only return resumes in these categories.
+            mode (str): "exact", "ivf", or "auto" to pick by pool size.
+            nprobe (int): Number of IVF lists scanned in "ivf" mode.
+
+        Returns:
+            list: (resume name, cosine similarity) pairs, best first.
+        """
+        query = normalize(query).reshape(self.dim)
+        rows = self.candidate_rows(query, mode, nprobe)
+        if rows is None:
+            rows = np.arange(self.size)
+            scores = self.vectors[:self.size] @ query
+        else:
+            scores = self.vectors[rows] @ query
+        keep = self.alive[rows]
+        if categories is not None:
+            codes = [self.category_ids[category] for category in categories if category in self.category_ids]
+            keep &= np.isin(self.category_codes[rows], codes)
+        rows, scores = rows[keep], scores[keep]
+        return [(self.keys[rows[i]], float(scores[i])) for i in top_k_indices(scores, k)]
+
+    def evaluate(self, queries, k=10, nprobe_values=(1, 2, 4, 8, 16)):
+        """
+        Measures IVF recall@k and latency against exact search.
+
+        Args:
+            queries (numpy.ndarray): Query embeddings, e.g. JD embeddings.
+            k (int): Number of results compared.
+            nprobe_values (iterable): IVF settings to report.
+
+        Returns:
+            list: One dict per setting with "mode", "nprobe", "recall" and "latency_ms" (mean per query).
+        """
+        def run(mode, nprobe=None):
+            start = time.perf_counter()
+            results = [{key for key, _ in self.search(query, k, mode=mode, nprobe=nprobe)} for query in queries]
+            return results, 1000 * (time.perf_counter() - start) / len(queries)
+
+        exact_results, exact_latency = run("exact")
+        report = [{"mode": "exact", "nprobe": None, "recall": 1.0, "latency_ms": exact_latency}]
+        for nprobe in nprobe_values:
+            results, latency = run("ivf", nprobe)
+            recall = np.mean([len(r & e) / max(len(e), 1) for r, e in zip(results, exact_results)])
+            report.append({"mode": "ivf", "nprobe": nprobe, "recall": float(recall), "latency_ms": latency})
+        return report
+
+    def save(self, directory):
+        """
+        Writes the index to a directory, dropping deleted rows.
+        """
+        os.makedirs(directory, exist_ok=True)
+        rows = np.flatnonzero(self.alive[:self.size])
+        new_row = np.full(self.size, -1, dtype=np.int64)
+        new_row[rows] = np.arange(len(rows))
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors[rows])
+        if self.centroids is not None:
+            np.save(os.path.join(directory, "centroids.npy"), self.centroids)
+        meta = {
+            "dim": self.dim,
+            "exact_threshold": self.exact_threshold,
+            "keys": [self.keys[row] for row in rows],
+            "categories": [self.categories[row] for row in rows],
+            "lists": [[int(new_row[row]) for row in rows_ if self.alive[row]] for rows_ in self.lists]
+            if self.centroids is not None else None,
+        }
+        with open(os.path.join(directory, "index.json"), "w", encoding="utf-8") as handle:
+            json.dump(meta, handle)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as handle:
+            meta = json.load(handle)
+        index = cls(meta["dim"], meta["exact_threshold"])
+        index.vectors = np.load(os.path.join(directory, "vectors.npy"))
+        index.size = len(index.vectors)
+        index.alive = np.ones(index.size, dtype=bool)
+        index.keys = meta["keys"]
+        index.categories = meta["categories"]
+        index.category_ids = {category: i for i, category in enumerate(dict.fromkeys(index.categories))}
+        index.category_codes = np.array([index.category_ids[c] for c in index.categories], dtype=np.int64)
+        index.row_of = {key: row for row, key in enumerate(index.keys)}
+        if meta["lists"] is not None:
+            index.centroids = np.load(os.path.join(directory, "centroids.npy"))
+            index.lists = meta["lists"]
+        return index
+
+
+def find_jd_name(jd_names, jd_name):
+    """
+    Returns the JD in jd_names with the given name, compared without the jd_data directory, so "de1_ola" finds
+    "jd_data\\de1_ola". Returns None when there is no such JD.
+    """
+    basename = get_jd_basename(jd_name)
+    return next((name for name in jd_names if get_jd_basename(name) == basename), None)
+
+
+def resume_categories_for_jd(jd_name):
+    # Resume job titles that are matched against this JD, e.g. "de1_ola" -> ["data_engineer"]
+    jd_category = get_jd_category(jd_name)
+    return [title for title, category in RESUME_JD_COMBI_TO_MATCH.items() if category == jd_category]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query the resume retrieval index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the index from the resume embedding store")
+    build_parser.add_argument("--nlist", type=int, default=None)
+    query_parser = subparsers.add_parser("query", help="Top resumes for a JD in the JD embedding store")
+    query_parser.add_argument("jd_name")
+    query_parser.add_argument("--k", type=int, default=50)
+    query_parser.add_argument("--same-category", action="store_true")
+    query_parser.add_argument("--mode", default="auto", choices=["auto", "exact", "ivf"])
+    query_parser.add_argument("--nprobe", type=int, default=8)
+    report_parser = subparsers.add_parser("report", help="Recall vs latency of IVF search against exact search")
+    report_parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = ResumeIndex.from_embeddings(EmbeddingModel.read_embeddings(RESUME_EMBEDDINGS_FILENAME))
+        index.train(args.nlist)
+        index.save(RESUME_INDEX_PATH)
+        print("Indexed", len(index), "resumes in", len(index.lists), "lists ->", RESUME_INDEX_PATH)
+    else:
+        index = ResumeIndex.load(RESUME_INDEX_PATH)
+        jd_embeddings = EmbeddingModel.read_embeddings(JD_EMBEDDINGS_FILENAME)
+        if args.command == "query":
+            jd_name = find_jd_name(jd_embeddings, args.jd_name)
+            if jd_name is None:
+                parser.error(f"no JD named {args.jd_name!r} in {JD_EMBEDDINGS_FILENAME}, valid names are: "
+                             + ", ".join(sorted(get_jd_basename(name) for name in jd_embeddings)))
+            categories = resume_categories_for_jd(jd_name) if args.same_category else None
+            for resume_name, score in index.search(jd_embeddings[jd_name], args.k, categories, args.mode,
+                                                   args.nprobe):
+                print(f"{resume_name}\t{int(round(score * 100.0))}")
+        else:
+            queries = np.asarray([jd_embeddings[key] for key in jd_embeddings])
+            for row in index.evaluate(queries, args.k):
+                print(f"{row['mode']:<6} nprobe={str(row['nprobe']):<5} recall@{args.k}={row['recall']:.3f} "
+                      f"latency={row['latency_ms']:.3f}ms")
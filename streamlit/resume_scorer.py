@@ -5,42 +5,57 @@ try:
 except RuntimeError:
     asyncio.set_event_loop(asyncio.new_event_loop())
     
-import streamlit as st
 import numpy as np
-import pandas as pd
+import os
 import re
-from sklearn.metrics.pairwise import cosine_similarity
 from constants import RESUME_PATH, JD_PATH, JD_EMBEDDINGS_FILENAME, RESUME_EMBEDDINGS_FILENAME, \
-    IS_EMBEDDINGS_CREATED
+    EMBEDDINGS_MANIFEST_FILENAME, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, INGEST_WORKERS, INGEST_CHUNK_SIZE, \
+    OCR_DPI, OCR_WORKERS, PDF_BACKENDS, PDF_TIMEOUT_SECONDS, PDF_MAX_PAGES, DEDUP_INDEX_FILENAME, DEDUP_THRESHOLD, \
+    DEDUP_NUM_PERM, DEDUP_BANDS, RESUME_INDEX_PATH
+from dedup import DuplicateDetector
 from directory_reader import DirectoryReader
+from embedding_cache import EmbeddingCache
 from embedding_model import EmbeddingModel
-import pytesseract
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract'  # Replace with your Tesseract path
+from tracing import print_summary, tracer
 
 def create_embeddings():
     """
-    Reads job descriptions (JDs) and resumes, generates embeddings for each, and saves the embeddings to disk.
-    """
-    dir_reader = DirectoryReader(JD_PATH, RESUME_PATH)
-    print("Reading JDs........")
-    jd_data = dir_reader.read_jd_files()
-    print("Reading Resumes........")
-    resume_data = dir_reader.read_resume_files()
-    print("Number of JDs -> ", len(jd_data))
-    print("Number of Resumes -> ", len(resume_data))
-
-    # Generate and Save JD Embeddings
-    print("Generating embeddings for JDs........")
-    embedding_model = EmbeddingModel()
-    jd_embeddings = embedding_model.get_embeddings(jd_data)
-    embedding_model.save_embeddings(jd_embeddings, JD_EMBEDDINGS_FILENAME)
-    print("Embeddings generated from JDs")
+    Brings the job description (JD) and resume embeddings on disk up to date.
 
-    # Generate and Save Resume Embeddings
-    print("Generating embeddings for Resumes........")
-    resume_embeddings = embedding_model.get_embeddings(resume_data)
-    embedding_model.save_embeddings(resume_embeddings, RESUME_EMBEDDINGS_FILENAME)
-    print("Embeddings generated for Resumes")
+    Only files that are new or changed since the last run are read and embedded, entries for deleted files are
+    dropped, and everything else is reused from the embedding stores (see EmbeddingCache). Resumes that are
+    near-duplicates of another resume reuse its embedding (see DuplicateDetector). A resume index built with
+    "python resume_index.py build" is updated in place (see ResumeIndex.sync).
+    """
+    dir_reader = DirectoryReader(JD_PATH, RESUME_PATH, workers=INGEST_WORKERS, chunk_size=INGEST_CHUNK_SIZE,
+                                 ocr_dpi=OCR_DPI, ocr_workers=OCR_WORKERS, pdf_backends=PDF_BACKENDS,
+                                 pdf_timeout=PDF_TIMEOUT_SECONDS, pdf_max_pages=PDF_MAX_PAGES)
+    # The backend is part of the model name, since quantized backends produce slightly different vectors
+    cache = EmbeddingCache(EMBEDDINGS_MANIFEST_FILENAME, f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}",
+                           dir_reader.extraction_settings())
+
+    print("Syncing JD embeddings........")
+    jd_embeddings, jd_stats = cache.sync("jd", dir_reader.list_jd_files(), JD_EMBEDDINGS_FILENAME,
+                                         lambda files: dir_reader.read_files(files, dir_reader.read_jd_file))
+    print("Number of JDs -> ", len(jd_embeddings), jd_stats)
+
+    print("Syncing resume embeddings........")
+    detector = DuplicateDetector(DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS)
+    if os.path.exists(DEDUP_INDEX_FILENAME):
+        detector = DuplicateDetector.load(DEDUP_INDEX_FILENAME)
+    resume_embeddings, resume_stats = cache.sync("resume", dir_reader.list_resume_files(),
+                                                 RESUME_EMBEDDINGS_FILENAME,
+                                                 lambda files: dir_reader.read_files(files, dir_reader.read_resume_file),
+                                                 detector)
+    detector.save(DEDUP_INDEX_FILENAME)
+    print("Number of Resumes -> ", len(resume_embeddings), resume_stats)
+    print("Duplicate resume clusters -> ", len(detector.clusters()), "(python dedup.py report lists them)")
+
+    if os.path.exists(os.path.join(RESUME_INDEX_PATH, "index.json")):
+        from resume_index import ResumeIndex  # imported here, since resume_index imports this module
+        index = ResumeIndex.load(RESUME_INDEX_PATH)
+        print("Resume index -> ", index.sync(resume_embeddings))
+        index.save(RESUME_INDEX_PATH)
 
 
 def read_embeddings():
@@ -50,16 +65,112 @@ def read_embeddings():
     Returns:
         tuple: A tuple containing dictionaries of job description embeddings and resume embeddings.
     """
-    embedding_model = EmbeddingModel()
-    jd_embeddings = embedding_model.read_embeddings(JD_EMBEDDINGS_FILENAME)
-    resume_embeddings = embedding_model.read_embeddings(RESUME_EMBEDDINGS_FILENAME)
+    # read_embeddings is a static method, so BERT is not loaded just to read the stores
+    jd_embeddings = EmbeddingModel.read_embeddings(JD_EMBEDDINGS_FILENAME)
+    resume_embeddings = EmbeddingModel.read_embeddings(RESUME_EMBEDDINGS_FILENAME)
     return jd_embeddings, resume_embeddings
 
 
+RESUME_JD_COMBI_TO_MATCH = {"data_engineer": "de", "data_analyst": "dataanalyst",
+                            "big_data_analyst": "bigdataanalyst",
+                            "mlops_engineer": "mlops", "data_scientist": "ds", "data_architect": "da",
+                            "machine_learning_engineer": "mle", "business_intelligence_analyst": "bianalyst"}
+JD_PATTERN = re.compile(r'\d+_[a-z]+$')
+RESUME_PATTERN = re.compile(r'_resume_\d+$')
+
+
+def get_jd_basename(jd_name):
+    """
+    Strips the jd_data directory from a JD name, e.g. "jd_data\\de1_ola" -> "de1_ola".
+    """
+    return jd_name.replace('jd_data\\', '').replace('jd_data/', '')
+
+
+def get_jd_category(jd_name):
+    """
+    Derives the JD category from a JD name, e.g. "jd_data\\de1_ola" -> "de".
+    """
+    return JD_PATTERN.sub('', get_jd_basename(jd_name))
+
+
+def get_resume_category(resume_name):
+    """
+    Derives the JD category a resume is matched against, e.g. "data_engineer_resume_40" -> "de".
+    """
+    return RESUME_JD_COMBI_TO_MATCH[RESUME_PATTERN.sub('', resume_name)]
+
+
+def stack_embeddings(embeddings):
+    """
+    Stacks an embedding dictionary into a single L2-normalized matrix.
+
+    Args:
+        embeddings (dict): A dictionary of names to embeddings.
+
+    Returns:
+        tuple: The list of names and a (len(names), dim) float64 matrix whose rows have unit norm.
+    """
+    names = list(embeddings.keys())
+    if not names:
+        return names, np.empty((0, 0))
+    matrix = getattr(embeddings, "matrix", None)  # EmbeddingStore rows are already stacked
+    if matrix is None:
+        matrix = [embeddings[name] for name in names]
+    matrix = np.asarray(matrix, dtype=np.float64)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return names, matrix / norms
+
+
+def build_category_index(names, get_category):
+    """
+    Groups row indices by category, keeping categories in order of first appearance.
+
+    Args:
+        names (list): Row names.
+        get_category (callable): Maps a row name to its category.
+
+    Returns:
+        dict: A dictionary of category to a NumPy array of row indices.
+    """
+    index = {}
+    for row, name in enumerate(names):
+        index.setdefault(get_category(name), []).append(row)
+    return {category: np.asarray(rows) for category, rows in index.items()}
+
+
+def top_k_indices(scores, k=1):
+    """
+    Returns the indices of the k highest scores in descending order of score.
+
+    Uses argpartition, so only the k selected scores are sorted.
+
+    Args:
+        scores (numpy.ndarray): A 1-D array of scores.
+        k (int): Number of indices to return.
+
+    Returns:
+        numpy.ndarray: Indices of the top k scores.
+    """
+    scores = np.asarray(scores)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=int)
+    if k == len(scores):
+        top = np.arange(len(scores))
+    else:
+        top = np.argpartition(-scores, k - 1)[:k]
+        top.sort()  # keep ties in their original order, as a stable sort would
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
 def get_similarity_dict(jd_embeddings, resume_embeddings):
     """
     Computes cosine similarity between job description embeddings and resume embeddings.
 
+    Both sides are stacked into normalized matrices once, and each resume is scored against the JDs
+    of its own category with a single matrix product per category.
+
     Args:
         jd_embeddings (dict): A dictionary of job description embeddings.
         resume_embeddings (dict): A dictionary of resume embeddings.
@@ -67,60 +178,53 @@ def get_similarity_dict(jd_embeddings, resume_embeddings):
     Returns:
         dict: A dictionary where keys are resume names and values are dictionaries with job description names and their similarity scores.
     """
-    resume_jd_combi_to_match = {"data_engineer": "de", "data_analyst": "dataanalyst",
-                                "big_data_analyst": "bigdataanalyst",
-                                "mlops_engineer": "mlops", "data_scientist": "ds", "data_architect": "da",
-                                "machine_learning_engineer": "mle", "business_intelligence_analyst": "bianalyst"}
-
-    jd_pattern = re.compile(r'\d+_[a-z]+$')
-    resume_pattern = re.compile(r'_resume_\d+$')
-    similarity_dict = {}
-    for key1 in jd_embeddings.keys():
-        for key2 in resume_embeddings.keys():
-            cleaned_jd_category = jd_pattern.sub('', key1).replace('jd_data\\', '').replace('jd_data/', '')
-            cleaned_resume_category = resume_pattern.sub('', key2)
-            if resume_jd_combi_to_match[cleaned_resume_category] == cleaned_jd_category:
-                sim_score = cosine_similarity(np.array(jd_embeddings[key1]).reshape(1, -1),
-                                              np.array(resume_embeddings[key2]).reshape(1, -1))[0][0]
-                if key2 not in similarity_dict.keys():
-                    similarity_dict[key2] = {}
-                similarity_dict[key2][key1] = {"score": sim_score}
-            else:
+    with tracer.span("get_similarity_dict", resumes=len(resume_embeddings), jds=len(jd_embeddings)):
+        jd_names, jd_matrix = stack_embeddings(jd_embeddings)
+        resume_names, resume_matrix = stack_embeddings(resume_embeddings)
+        jd_index = build_category_index(jd_names, get_jd_category)
+        resume_index = build_category_index(resume_names, get_resume_category)
+
+        similarity_dict = {}
+        for category, jd_rows in jd_index.items():
+            resume_rows = resume_index.get(category)
+            if resume_rows is None:
                 continue
+            scores = resume_matrix[resume_rows] @ jd_matrix[jd_rows].T
+            for i, resume_row in enumerate(resume_rows):
+                similarity_dict[resume_names[resume_row]] = {
+                    jd_names[jd_row]: {"score": scores[i, j]} for j, jd_row in enumerate(jd_rows)
+                }
     return similarity_dict
 
 
-def get_top_matching_job(resume_name):
+def get_top_matching_job(similarity_dict, resume_name):
     """
     Finds the top matching job description for a given resume based on similarity scores.
 
     Args:
+        similarity_dict (dict): Scores as returned by get_similarity_dict.
         resume_name (str): The name of the resume.
 
     Returns:
         list: A list containing the job description name and the matching score.
     """
-    score_list = [[key, SIMILARITY_DICT[resume_name][key]['score']]
-                  for key in SIMILARITY_DICT[resume_name].keys()]
-    score_list = sorted(score_list, key=lambda x: x[1], reverse=True)
-    return score_list[0]
+    jd_names = list(similarity_dict[resume_name].keys())
+    scores = np.array([similarity_dict[resume_name][key]['score'] for key in jd_names])
+    best = top_k_indices(scores, 1)[0]
+    return [jd_names[best], scores[best]]
 
 
-if not IS_EMBEDDINGS_CREATED:
+# Guarded so worker processes started by DirectoryReader can import this module without re-running it.
+# For large resume folders use batch_scorer.py, which streams the work and can resume an interrupted run.
+if __name__ == "__main__":
     create_embeddings()
 
-jd_embeddings, resume_embeddings = read_embeddings()
-SIMILARITY_DICT = get_similarity_dict(jd_embeddings, resume_embeddings)
-output = []
-for key in SIMILARITY_DICT.keys():
-    top_matching_job = get_top_matching_job(key)
-    output.append([key, top_matching_job[0], int(round(top_matching_job[1] * 100.0))])
-    print("Resume Name: ", key, "\nJD Name: ", top_matching_job[0],
-          "\nMatching Score: ", int(round(top_matching_job[1] * 100.0)))
-    print("----------")
-
-match_df = pd.DataFrame(output, columns=["resume_name", "jd_name", "matching_score"])
-match_df.head(100)
-
-
-get_top_matching_job("big_data_analyst_resume_1")
\ No newline at end of file
+    jd_embeddings, resume_embeddings = read_embeddings()
+    similarity_dict = get_similarity_dict(jd_embeddings, resume_embeddings)
+    for key in similarity_dict.keys():
+        top_matching_job = get_top_matching_job(similarity_dict, key)
+        print("Resume Name: ", key, "\nJD Name: ", top_matching_job[0],
+              "\nMatching Score: ", int(round(top_matching_job[1] * 100.0)))
+        print("----------")
+    print("Stage timings (stages run in worker processes are timed as a whole by read_files):")
+    print_summary()
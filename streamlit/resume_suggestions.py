@@ -1,27 +1,156 @@
 # Description: Streamlit app for generating resume suggestions based on a job description.
 # The app allows users to upload their resume and a job description, and provides detailed insights and actionable suggestions to improve the resume.
+import logging
 import os
+import time
+from contextlib import contextmanager
+from io import BytesIO
 import openai
 import streamlit as st
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferWindowMemory
-from langchain_core.messages import SystemMessage
-from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
-from streamlit_feedback import streamlit_feedback
 from constants import (
-    OPENAI_API_KEY, TEMPLATE_CONTENT, comparison_prompt, resume_analysis_prompt,
-    job_description_analysis_prompt, gap_analysis_prompt, actionable_steps_prompt, experience_enhancement_prompt,
-    additional_qualifications_prompt, resume_tailoring_prompt, relevant_skills_highlight_prompt,
-    resume_formatting_prompt, resume_length_prompt, resume_edit_prompt
+    TEMPLATE_CONTENT, resume_analysis_reference_prompt, gap_analysis_reference_prompt,
+    actionable_steps_reference_prompt, resume_edit_reference_prompt, cover_letter_reference_prompt, LLM_MODEL_NAME,
+    LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_RATE_LIMIT_BURST, LLM_MAX_RETRIES, LLM_CACHE_PATH,
+    LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS, RESUME_TOKEN_BUDGET, JD_TOKEN_BUDGET, JD_PATH, RESUME_PATH, OCR_DPI,
+    PDF_BACKENDS, PDF_TIMEOUT_SECONDS, PDF_MAX_PAGES, OCR_JOB_WORKERS, OCR_JOB_MAX_PENDING, OCR_JOB_MAX_RESULTS,
+    DEVELOPER_PANEL, PROFILE_DIR, DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_MAX_UPLOADS
 )
-from directory_reader import DirectoryReader
+from dedup import UploadDeduplicator
+from directory_reader import DirectoryReader, pages_to_ocr
+from llm_client import RateLimiter, chat_completion, imap_concurrently, stream_chat_completion
+from ocr_jobs import OcrJobQueue, QueueFullError
+from pdf_backends import PdfExtractionError, extract_pdf_pages
+from response_cache import ResponseCache
+from prompt_builder import build_report_sections, build_system_prompt, count_tokens, log_request_tokens
+from tracing import profiled, tracer
+
+logger = logging.getLogger(__name__)
 
 # Set up OpenAI API key
 openai.api_key = st.secrets["OPENAI_API_KEY"]
 
+# One rate limiter and one response cache for the whole server process, shared by all sessions and reruns
+@st.cache_resource
+def get_rate_limiter():
+    return RateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_RATE_LIMIT_BURST)
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS)
+
+# Near-duplicate uploads are noted across all sessions; only signatures are kept, never the resumes
+@st.cache_resource
+def get_upload_deduplicator():
+    return UploadDeduplicator(DEDUP_MAX_UPLOADS, DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS)
+
+# Scanned uploads are OCR'd by a bounded pool of background workers shared by all sessions, so the script thread
+# never blocks on OCR. ocr_workers=1 keeps the total number of OCR threads at OCR_JOB_WORKERS.
+@st.cache_resource
+def get_ocr_job_queue():
+    dir_reader = DirectoryReader(JD_PATH, RESUME_PATH, ocr_dpi=OCR_DPI, ocr_workers=1, pdf_backends=PDF_BACKENDS,
+                                 pdf_timeout=PDF_TIMEOUT_SECONDS, pdf_max_pages=PDF_MAX_PAGES)
+    return OcrJobQueue(dir_reader, OCR_JOB_WORKERS, OCR_JOB_MAX_PENDING, OCR_JOB_MAX_RESULTS)
+
+# Text extraction is cached per uploaded file content, so reruns do not parse the same PDF again. Returns the text
+# layer and whether any page lacks one and has images, so it needs OCR.
+@st.cache_data(max_entries=100)
+def extract_resume_text(file_bytes):
+    try:
+        pdf_text = extract_pdf_pages(BytesIO(file_bytes), PDF_BACKENDS, PDF_TIMEOUT_SECONDS, PDF_MAX_PAGES)
+    except PdfExtractionError:
+        return "", True
+    ocr_needed = bool(pages_to_ocr(pdf_text.page_texts, pdf_text.page_images))
+    return "\n".join(pdf_text.page_texts).strip().lower(), ocr_needed
+
+# Polls the session's OCR job once a second without rerunning the rest of the script, then reruns it when done
+@st.fragment(run_every=1.0)
+def show_ocr_progress(job_id):
+    job = ocr_job_queue.get(job_id)
+    if job is None or job.is_finished:
+        st.rerun()
+    pages = f"page {job.pages_done} of {job.pages_total}" if job.pages_total else job.state
+    st.progress(job.progress(), text=f"Reading scanned pages with OCR: {pages}")
+
+def get_resume_text(file_bytes):
+    """
+    Returns the text of an uploaded resume, or None while its scanned pages are still being OCR'd in the background.
+
+    The OCR job's id is kept in st.session_state.ocr_job_id, so reruns poll the same job instead of starting another.
+    When the OCR queue is full, or the job fails, the text layer alone is used.
+    """
+    text, ocr_needed = extract_resume_text(file_bytes)
+    if not ocr_needed:
+        return text
+    content_hash = OcrJobQueue.content_hash(file_bytes)
+    cached_text = ocr_job_queue.cached_text(content_hash)
+    if cached_text is not None:
+        return cached_text
+    job = ocr_job_queue.get(st.session_state.get("ocr_job_id"))
+    if job is None or job.content_hash != content_hash:
+        try:
+            job = ocr_job_queue.submit(file_bytes)
+        except QueueFullError:
+            st.sidebar.warning("The server is busy reading other scanned resumes, so only the text layer of this "
+                               "one is used for now. Re-upload it in a minute for a full read.")
+            return text or None
+        st.session_state.ocr_job_id = job.job_id
+    if job.state == "failed":
+        st.sidebar.error(f"Could not OCR the scanned pages of this resume ({job.error}).")
+        return text or None
+    if job.state == "done":
+        return job.text
+    with st.sidebar:
+        show_ocr_progress(job.job_id)
+    return None
+
+# Profiles the enclosed request with cProfile when "Profile the next request" was clicked in the developer panel
+@contextmanager
+def request_profile(request_name):
+    if not st.session_state.pop("profile_next_request", False):
+        yield
+        return
+    file_name = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{request_name.replace(' ', '_')}.prof")
+    with profiled(file_name) as summary:
+        yield
+    st.session_state.last_profile = (file_name, summary.getvalue())
+
+# Stage timings of the whole server process, their exports, and the request profiler, for developers
+def show_developer_panel():
+    with st.sidebar.expander("Developer: stage timings", expanded=False):
+        summary = tracer.summary()
+        if summary:
+            st.dataframe([{"stage": name, "count": stage["count"], "errors": stage["errors"],
+                           "p50 ms": round(stage["p50_ms"], 1), "p95 ms": round(stage["p95_ms"], 1),
+                           "total s": round(stage["total_ms"] / 1000, 2),
+                           "totals": ", ".join(f"{key}={value:g}" for key, value in stage["totals"].items())}
+                          for name, stage in summary.items()], hide_index=True)
+        else:
+            st.caption("No stages timed yet.")
+        for span in [span for span in tracer.recent_spans(100) if span["error"]][-3:]:
+            st.caption(f"{span['name']} failed: {span['error']}")
+        col1, col2 = st.columns(2)
+        col1.download_button("JSON", tracer.to_json(), "stage_timings.json", "application/json")
+        col2.download_button("Prometheus", tracer.to_prometheus(), "stage_timings.prom", "text/plain")
+        if st.button("Profile the next request"):
+            st.session_state.profile_next_request = True
+        if st.session_state.get("profile_next_request"):
+            st.caption("The next request will be profiled.")
+        if "last_profile" in st.session_state:
+            file_name, profile_summary = st.session_state.last_profile
+            st.caption(f"Last profile -> {file_name}")
+            st.code(profile_summary, language=None)
+        if st.button("Reset stage timings"):
+            tracer.reset()
+
 # Set up Streamlit page
 st.set_page_config(page_title="Resume Analyser")
 
+# Resolved on the script thread, since Streamlit caches need the script run context, and then used by
+# generate_response from any thread
+rate_limiter = get_rate_limiter()
+response_cache = get_response_cache()
+ocr_job_queue = get_ocr_job_queue()
+
 # Initialize session state for chat messages
 if "messages" not in st.session_state:
     st.session_state.messages = [
@@ -34,33 +163,87 @@ with st.sidebar:
     st.write("Upload your resume and JD for my recommendations.")
     resume_file = st.file_uploader("Upload your resume (pdf file only)", type=["pdf"])
     jd_file = st.file_uploader("Upload your JD (txt file only)", type=["txt"])
+    cache_stats = response_cache.get_stats()
+    st.caption(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+               f"{cache_stats['entries']} entries")
+    ocr_stats = ocr_job_queue.get_stats()
+    st.caption(f"OCR queue: {ocr_stats['running']} running, {ocr_stats['queued']} waiting")
 
 # Extract content from uploaded files
 resume_content = None
 job_description_content = None
 
 if resume_file is not None and jd_file is not None:
-    directory_reader = DirectoryReader("", "")
-    resume_content = directory_reader.extract_text_from_pdf(resume_file)
+    resume_content = get_resume_text(resume_file.getvalue())
+    if resume_content and get_upload_deduplicator().check(resume_content) is not None:
+        st.sidebar.caption("This resume is a near-duplicate of an earlier upload. It is analysed from its own text.")
     if jd_file.type == 'text/plain':
         from io import StringIO
         stringio = StringIO(jd_file.getvalue().decode('utf-8'))
         job_description_content = stringio.read()
 
-# System prompt for the chatbot
-SYSTEM_PROMPT = "\n\n" + TEMPLATE_CONTENT + "<RESUME STARTS HERE> {}. <RESUME ENDS HERE> with the job description: <JOB DESCRIPTION STARTS HERE> {}.<JOB DESCRIPTION ENDS HERE>\n\nBe crisp and clear in response. DO NOT provide the resume and job description in the response\n\n".format(resume_content, job_description_content)
+# System prompt for the chatbot. It is the only place the resume and JD are sent; prompts refer back to them.
+# Documents over their token budget are replaced by a digest of their sections.
+SYSTEM_PROMPT = build_system_prompt(TEMPLATE_CONTENT, resume_content, job_description_content, LLM_MODEL_NAME,
+                                    RESUME_TOKEN_BUDGET, JD_TOKEN_BUDGET)
 
-# Function to generate a response using OpenAI's API
-def generate_response(prompt_input):
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini-2024-07-18",  # Use GPT-4o mini model
-            messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt_input}],
-            temperature=0.0
-        )
-        return response.choices[0].message["content"]
-    except Exception as e:
-        return f"Error: {e}"
+# Function to build the chat messages for a prompt and the key its response is cached under
+def build_request(prompt_input, template_name):
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt_input}]
+    cache_key = ResponseCache.make_key(template_name, messages, resume_content, job_description_content,
+                                       LLM_MODEL_NAME, 0.0)
+    input_tokens = log_request_tokens(template_name, messages, LLM_MODEL_NAME)
+    return messages, cache_key, input_tokens
+
+# Function to generate a response using OpenAI's API. Responses are cached per template, resume, JD and model.
+# Failures are shown to the user as an "Error:" message, and recorded on the request's span and in the log.
+def generate_response(prompt_input, template_name="free_form"):
+    with tracer.span("generate_response", template=template_name) as span:
+        messages, cache_key, input_tokens = build_request(prompt_input, template_name)
+        cached_response = response_cache.get(cache_key)
+        span.set(prompt_tokens=input_tokens, cache_hit=cached_response is not None)
+        if cached_response is not None:
+            return cached_response
+        try:
+            response = chat_completion(
+                messages,
+                model=LLM_MODEL_NAME,
+                temperature=0.0,
+                rate_limiter=rate_limiter,
+                max_retries=LLM_MAX_RETRIES
+            )
+            span.set(completion_tokens=count_tokens(response, LLM_MODEL_NAME))
+            response_cache.put(cache_key, response, template_name, LLM_MODEL_NAME)
+            return response
+        except Exception as e:
+            span.set_error(e)
+            logger.warning("LLM request %s failed: %s: %s", template_name, type(e).__name__, e)
+            return f"Error: {e}"
+
+# Function to stream a response token by token, e.g. into st.write_stream. The full text is cached once it is done.
+def stream_response(prompt_input, template_name="free_form"):
+    with tracer.span("stream_response", template=template_name) as span:
+        messages, cache_key, input_tokens = build_request(prompt_input, template_name)
+        cached_response = response_cache.get(cache_key)
+        span.set(prompt_tokens=input_tokens, cache_hit=cached_response is not None)
+        if cached_response is not None:
+            yield cached_response
+            return
+        pieces = []
+        try:
+            for piece in stream_chat_completion(messages, model=LLM_MODEL_NAME, temperature=0.0,
+                                                rate_limiter=rate_limiter, max_retries=LLM_MAX_RETRIES):
+                if not pieces:
+                    span.set(first_token_ms=span.elapsed_ms())
+                pieces.append(piece)
+                yield piece
+        except Exception as e:
+            span.set_error(e)
+            logger.warning("LLM stream %s failed: %s: %s", template_name, type(e).__name__, e)
+            yield f"Error: {e}"
+            return
+        span.set(completion_tokens=count_tokens("".join(pieces), LLM_MODEL_NAME))
+    response_cache.put(cache_key, "".join(pieces), template_name, LLM_MODEL_NAME)
 
 # Function to display the four buttons as part of the chatbot's message
 def display_buttons():
@@ -88,29 +271,14 @@ def generate_report():
         return
 
     with st.spinner("Generating report..."):
-        comparison_analysis = generate_response(comparison_prompt.format(resume_content, job_description_content))
-        resume_analysis = generate_response(resume_analysis_prompt.format(resume_content))
-        job_description_analysis = generate_response(job_description_analysis_prompt.format(job_description_content))
-        gap_analysis = generate_response(gap_analysis_prompt.format(resume_content, job_description_content))
-        actionable_steps_analysis = generate_response(actionable_steps_prompt.format(resume_content, job_description_content))
-        experience_enhancement_analysis = generate_response(experience_enhancement_prompt.format(resume_content, job_description_content))
-        additional_qualifications_analysis = generate_response(additional_qualifications_prompt.format(resume_content, job_description_content))
-        resume_tailoring_analysis = generate_response(resume_tailoring_prompt.format(resume_content, job_description_content))
-        relevant_skills_highlight_analysis = generate_response(relevant_skills_highlight_prompt.format(resume_content, job_description_content))
-        resume_formatting_analysis = generate_response(resume_formatting_prompt.format(resume_content, job_description_content))
-        resume_length_analysis = generate_response(resume_length_prompt.format(resume_content, job_description_content))
-
-        report = f"**Comparison Analysis:**\n{comparison_analysis}\n\n" \
-                 f"**Resume Analysis:**\n{resume_analysis}\n\n" \
-                 f"**Job Description Analysis:**\n{job_description_analysis}\n\n" \
-                 f"**Gap Analysis:**\n{gap_analysis}\n\n" \
-                 f"**Actionable Steps:**\n{actionable_steps_analysis}\n\n" \
-                 f"**Experience Enhancement:**\n{experience_enhancement_analysis}\n\n" \
-                 f"**Additional Qualifications:**\n{additional_qualifications_analysis}\n\n" \
-                 f"**Resume Tailoring:**\n{resume_tailoring_analysis}\n\n" \
-                 f"**Relevant Skills Highlight:**\n{relevant_skills_highlight_analysis}\n\n" \
-                 f"**Resume Formatting:**\n{resume_formatting_analysis}\n\n" \
-                 f"**Resume Length:**\n{resume_length_analysis}"
+        report_sections = build_report_sections()
+        # The sections are independent, so request them concurrently, and show each one as soon as it and the
+        # sections before it are ready
+        analyses = imap_concurrently(lambda section: generate_response(section[2], section[1]),
+                                     report_sections, LLM_MAX_CONCURRENCY)
+        with st.chat_message("assistant"):
+            report = st.write_stream(("\n\n" if i else "") + f"**{title}:**\n{analysis}"
+                                     for i, ((title, _, _), analysis) in enumerate(zip(report_sections, analyses)))
 
         st.session_state.messages.append({"role": "assistant", "content": report})
 
@@ -120,9 +288,9 @@ def generate_new_resume():
         st.warning("Please upload both a resume and a job description before generating the report.")
         return
 
-    with st.spinner("Generating new resume..."):
-        gap_analysis = generate_response(gap_analysis_prompt.format(resume_content, job_description_content))
-        new_resume = generate_response(resume_edit_prompt.format(resume_content, job_description_content))
+    with st.chat_message("assistant"):
+        st.write("**New Resume Based on Job Description:**")
+        new_resume = st.write_stream(stream_response(resume_edit_reference_prompt, "resume_edit_prompt"))
         st.session_state.messages.append({"role": "assistant", "content": f"**New Resume Based on Job Description:**\n\n{new_resume}"})
 
 def generate_cover_letter():
@@ -130,9 +298,9 @@ def generate_cover_letter():
         st.warning("Please upload both a resume and a job description before generating the cover letter.")
         return
 
-    with st.spinner("Generating cover letter..."):
-        cover_letter_prompt = f"Generate a professional cover letter based on the following resume and job description:\n\nResume:\n{resume_content}\n\nJob Description:\n{job_description_content}\n\nThe cover letter should be tailored to the job role, highlighting relevant skills and experience.Include details like name, address, email, phone number, linkedin, github, personal portfolio etc from resume if provided. Add details of address of company, hiring manager name, company name, job title, company address, city, state, zip code from job decription. set date as the current date. The cover letter should be concise, engaging, and professional."
-        cover_letter = generate_response(cover_letter_prompt)
+    with st.chat_message("assistant"):
+        st.write("**Generated Cover Letter:**")
+        cover_letter = st.write_stream(stream_response(cover_letter_reference_prompt, "cover_letter_prompt"))
         st.session_state.messages.append({"role": "assistant", "content": f"**Generated Cover Letter:**\n\n{cover_letter}"})
 
 # Display chat messages
@@ -142,26 +310,28 @@ for message in st.session_state.messages:
         if message["role"] == "assistant" and len(st.session_state.messages) == 1:
             display_buttons()
 
+# The developer panel is shown when DEVELOPER_PANEL is set or the app is opened with ?dev=1
+if DEVELOPER_PANEL or st.query_params.get("dev") == "1":
+    show_developer_panel()
+
 # Handle button clicks
 if "button_clicked" in st.session_state:
-    if st.session_state.button_clicked == "Detailed Report":
-        generate_report()
-    elif st.session_state.button_clicked == "Actionable Suggestions":
-        prompt = actionable_steps_prompt.format(resume_content, job_description_content)
-        result = generate_response(prompt)
-        st.session_state.messages.append({"role": "assistant", "content": result})
-    elif st.session_state.button_clicked == "Skill Gap Analysis":
-        prompt = gap_analysis_prompt.format(resume_content, job_description_content)
-        result = generate_response(prompt)
-        st.session_state.messages.append({"role": "assistant", "content": result})
-    elif st.session_state.button_clicked == "Strengths & Weaknesses":
-        prompt = resume_analysis_prompt.format(resume_content)
-        result = generate_response(prompt)
-        st.session_state.messages.append({"role": "assistant", "content": result})
-    elif st.session_state.button_clicked == "Generate New Resume":
-        generate_new_resume()
-    elif st.session_state.button_clicked == "Generate Cover Letter":
-        generate_cover_letter()
+    with request_profile(st.session_state.button_clicked):
+        if st.session_state.button_clicked == "Detailed Report":
+            generate_report()
+        elif st.session_state.button_clicked == "Actionable Suggestions":
+            result = generate_response(actionable_steps_reference_prompt, "actionable_steps_prompt")
+            st.session_state.messages.append({"role": "assistant", "content": result})
+        elif st.session_state.button_clicked == "Skill Gap Analysis":
+            result = generate_response(gap_analysis_reference_prompt, "gap_analysis_prompt")
+            st.session_state.messages.append({"role": "assistant", "content": result})
+        elif st.session_state.button_clicked == "Strengths & Weaknesses":
+            result = generate_response(resume_analysis_reference_prompt, "resume_analysis_prompt")
+            st.session_state.messages.append({"role": "assistant", "content": result})
+        elif st.session_state.button_clicked == "Generate New Resume":
+            generate_new_resume()
+        elif st.session_state.button_clicked == "Generate Cover Letter":
+            generate_cover_letter()
 
     # Clear the button state and trigger a UI refresh
     del st.session_state.button_clicked
@@ -176,10 +346,9 @@ if prompt := st.chat_input():
     with st.chat_message("user"):
         st.write(prompt)
 
-    # Generate response and display it immediately
-    response = generate_response(prompt + SYSTEM_PROMPT)
-    with st.chat_message("assistant"):
-        st.write(response)
+    # Stream the response as it is generated
+    with st.chat_message("assistant"), request_profile("chat"):
+        response = st.write_stream(stream_response(prompt))
 
     # Append response to session state
     st.session_state.messages.append({"role": "assistant", "content": response})
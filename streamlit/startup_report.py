@@ -0,0 +1,63 @@
+# Description: Reports how long each app module takes to import, to keep the Streamlit cold start fast.
+# Every module is imported in a fresh interpreter with `python -X importtime`, so the numbers include all of
+# its dependencies and are not hidden by modules another import already loaded.
+# Usage: python startup_report.py [module ...]
+import re
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["pdf_backends", "directory_reader", "embedding_store", "embedding_model", "embedding_cache",
+                   "llm_client", "response_cache", "prompt_builder", "resume_scorer"]
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def run_importtime(code):
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+
+
+def interpreter_startup_modules():
+    # Modules every interpreter imports at startup, e.g. site and encodings, are left out of the report
+    return {match.group(4) for match in map(IMPORT_TIME_LINE.match, run_importtime("pass").stderr.splitlines())
+            if match}
+
+
+def measure_import(module, ignored=frozenset()):
+    """
+    Imports module in a fresh interpreter and collects its import-time profile.
+
+    Args:
+        module (str): Name of the module to import.
+        ignored (set): Package names left out of the returned list.
+
+    Returns:
+        tuple: The total import time in seconds (None if the import failed), a list of
+        (cumulative seconds, package) for the top-level packages it pulled in, and the error output if it failed.
+    """
+    result = run_importtime(f"import {module}")
+    packages = []
+    total = None
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)) / 1e6, len(match.group(3)), match.group(4)
+        if name == module:
+            total = cumulative
+        elif indent <= 3 and name not in ignored:  # imported directly by the module
+            packages.append((cumulative, name))
+    if result.returncode != 0:
+        error = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        return None, sorted(packages, reverse=True), "\n".join(error[-1:])
+    return total, sorted(packages, reverse=True), ""
+
+
+if __name__ == "__main__":
+    modules = sys.argv[1:] or DEFAULT_MODULES
+    ignored = interpreter_startup_modules()
+    for module in modules:
+        total, packages, error = measure_import(module, ignored)
+        if total is None:
+            print(f"{module:<20} failed: {error}")
+            continue
+        heaviest = ", ".join(f"{name} {seconds:.2f}s" for seconds, name in packages[:5])
+        print(f"{module:<20} {total:6.2f}s   heaviest: {heaviest}")
@@ -0,0 +1,10 @@
+from batch_scorer import Checkpoint
+
+
+def test_checkpoint_survives_a_restart(tmp_path):
+    path = str(tmp_path / "scores.csv.checkpoint")
+    checkpoint = Checkpoint(path)
+    assert checkpoint.done == set()
+    checkpoint.mark(["resumes/a.pdf", "resumes/b.pdf"])
+    checkpoint.mark(["resumes/c.pdf"])
+    assert Checkpoint(path).done == {"resumes/a.pdf", "resumes/b.pdf", "resumes/c.pdf"}
@@ -0,0 +1,77 @@
+import numpy as np
+
+from dedup import DuplicateDetector, UploadDeduplicator
+from response_cache import ResponseCache, text_hash
+
+
+def make_resume(seed, words=200):
+    return " ".join(f"skill{i}" for i in np.random.default_rng(seed).integers(0, 5000, words))
+
+
+def test_near_duplicates_share_a_canonical_copy():
+    detector = DuplicateDetector()
+    original = make_resume(1)
+    assert detector.add("a", original) == "a"
+    assert detector.add("b", original + " python sql") == "a"
+    assert detector.add("c", make_resume(2)) == "c"
+    assert detector.clusters() == {"a": ["b"]}
+
+
+def test_documents_without_words_are_never_matched():
+    detector = DuplicateDetector()
+    assert detector.add("a", "") == "a"
+    assert detector.add("b", "  ") == "b"
+    assert len(detector) == 0
+
+
+def test_removing_a_canonical_copy_promotes_a_member():
+    detector = DuplicateDetector()
+    original = make_resume(1)
+    detector.add("a", original)
+    detector.add("b", original + " python")
+    detector.add("c", original + " sql")
+    detector.remove("a")
+    assert detector.clusters() == {"b": ["c"]}
+
+
+def test_save_and_load(tmp_path):
+    detector = DuplicateDetector()
+    original = make_resume(1)
+    detector.add("a", original)
+    detector.add("b", original + " python")
+    file_name = str(tmp_path / "detector.npz")
+    detector.save(file_name)
+    loaded = DuplicateDetector.load(file_name)
+    assert loaded.clusters() == {"a": ["b"]}
+    assert loaded.add("c", original + " sql") == "a"
+
+
+def test_near_duplicate_upload_is_reported_by_hash_and_keeps_its_own_text():
+    deduplicator = UploadDeduplicator()
+    original = make_resume(1)
+    near_duplicate = original + " python sql"
+    assert deduplicator.check(original) is None
+    assert deduplicator.check(near_duplicate) == text_hash(original)
+    # Only signatures are kept, never the text of an upload
+    assert set(deduplicator.detector.signatures) == {text_hash(original), text_hash(near_duplicate)}
+    # The near-duplicate is analysed from its own text, so its cached analyses are not the original's
+    messages = [{"role": "user", "content": "Review this resume."}]
+    assert ResponseCache.make_key("review", messages, near_duplicate, "jd", "gpt-3.5-turbo", 0.0) != \
+        ResponseCache.make_key("review", messages, original, "jd", "gpt-3.5-turbo", 0.0)
+
+
+def test_identical_upload_is_not_a_near_duplicate():
+    deduplicator = UploadDeduplicator()
+    original = make_resume(1)
+    assert deduplicator.check(original) is None
+    assert deduplicator.check(original) is None
+
+
+def test_oldest_uploads_are_forgotten():
+    deduplicator = UploadDeduplicator(max_uploads=2)
+    original = make_resume(1)
+    deduplicator.check(original)
+    deduplicator.check(make_resume(2))
+    deduplicator.check(make_resume(3))
+    assert len(deduplicator.detector) == 2
+    assert deduplicator.check(original + " python") is None
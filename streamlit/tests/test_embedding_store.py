@@ -0,0 +1,79 @@
+import glob
+import json
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from embedding_store import EmbeddingStore, convert_pickle_store, upgrade_legacy_store
+
+
+def make_embeddings(count=5, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return {f"jd_data\\jd{i}": rng.standard_normal(dim).tolist() for i in range(count)}
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_round_trip(tmp_path, dtype):
+    embeddings = make_embeddings()
+    file_name = str(tmp_path / "jd_embeddings.npy")
+    EmbeddingStore.save(embeddings, file_name, dtype=dtype)
+    store = EmbeddingStore.load(file_name)
+    assert isinstance(store.matrix, np.memmap)
+    assert store.matrix.dtype == np.dtype(dtype)
+    assert list(store) == list(embeddings)
+    for key, embedding in embeddings.items():
+        np.testing.assert_allclose(store[key], embedding, rtol=1e-3, atol=1e-3)
+
+
+def test_save_keeps_the_latest_two_versions(tmp_path):
+    file_name = str(tmp_path / "jd_embeddings.npy")
+    for seed in range(3):
+        EmbeddingStore.save(make_embeddings(seed=seed), file_name)
+    versions = glob.glob(str(tmp_path / "jd_embeddings.v*.npy"))
+    assert len(versions) == 2
+    _, matrix_file = EmbeddingStore.read_key_index(file_name)
+    assert matrix_file == max(versions)
+    np.testing.assert_allclose(EmbeddingStore.load(file_name)["jd_data\\jd0"], make_embeddings(seed=2)["jd_data\\jd0"],
+                               rtol=1e-6)
+
+
+def test_store_can_be_saved_again(tmp_path):
+    file_name = str(tmp_path / "jd_embeddings.npy")
+    EmbeddingStore.save(make_embeddings(), file_name)
+    store = EmbeddingStore.load(file_name)
+    EmbeddingStore.save(store, file_name)
+    assert EmbeddingStore.load(file_name).as_dict().keys() == make_embeddings().keys()
+
+
+def test_upgrade_legacy_store(tmp_path):
+    embeddings = make_embeddings()
+    file_name = str(tmp_path / "jd_embeddings.npy")
+    np.save(file_name, np.asarray(list(embeddings.values()), dtype=np.float16))
+    with open(EmbeddingStore.keys_path(file_name), "w", encoding="utf-8") as handle:
+        json.dump(list(embeddings), handle)
+    assert list(EmbeddingStore.load(file_name)) == list(embeddings)
+
+    assert upgrade_legacy_store(file_name)
+    assert not os.path.exists(file_name)
+    store = EmbeddingStore.load(file_name)
+    assert store.matrix.dtype == np.float16
+    assert list(store) == list(embeddings)
+    assert not upgrade_legacy_store(file_name)
+
+
+def test_convert_pickle_store(tmp_path):
+    embeddings = make_embeddings()
+    pickle_file = str(tmp_path / "jd_embeddings.pkl")
+    with open(pickle_file, "wb") as handle:
+        pickle.dump(embeddings, handle)
+    file_name = convert_pickle_store(pickle_file)
+    assert file_name == str(tmp_path / "jd_embeddings.npy")
+    assert EmbeddingStore.exists(file_name)
+    np.testing.assert_allclose(EmbeddingStore.load(file_name).matrix, list(embeddings.values()), rtol=1e-6)
+
+
+def test_key_index_must_match_the_matrix():
+    with pytest.raises(ValueError):
+        EmbeddingStore(["a", "b"], np.zeros((3, 4), dtype=np.float32))
@@ -0,0 +1,68 @@
+import time
+
+import openai
+import pytest
+
+import llm_client
+from fake_completion_server import start_server
+from llm_client import RateLimiter, chat_completion, map_concurrently, stream_chat_completion
+
+MESSAGES = [{"role": "user", "content": "Review this resume."}]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = start_server()
+    monkeypatch.setattr(openai, "api_base", server.api_base)
+    monkeypatch.setattr(openai, "api_key", "test")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_chat_completion(server):
+    assert chat_completion(MESSAGES, "gpt-3.5-turbo") == "Fake completion for: Review this resume."
+    assert server.request_count == 1
+
+
+def test_stream_chat_completion(server):
+    chunks = list(stream_chat_completion(MESSAGES, "gpt-3.5-turbo"))
+    assert len(chunks) > 1
+    assert "".join(chunks) == "Fake completion for: Review this resume."
+
+
+def test_rate_limited_requests_are_retried(server, monkeypatch):
+    server.rate_limit_rate = 1.0
+
+    def backoff_delay(attempt, error=None):
+        # The service recovers after the second rate-limited attempt
+        if attempt == 1:
+            server.rate_limit_rate = 0.0
+        return 0.0
+
+    monkeypatch.setattr(llm_client, "backoff_delay", backoff_delay)
+    assert chat_completion(MESSAGES, "gpt-3.5-turbo") == "Fake completion for: Review this resume."
+    assert server.request_count == 3
+
+
+def test_retries_give_up_after_max_retries(server, monkeypatch):
+    server.server_error_rate = 1.0
+    monkeypatch.setattr(llm_client, "backoff_delay", lambda attempt, error=None: 0.0)
+    with pytest.raises(openai.error.ServiceUnavailableError):
+        chat_completion(MESSAGES, "gpt-3.5-turbo", max_retries=2)
+    assert server.request_count == 3
+
+
+def test_rate_limiter_lets_a_burst_through():
+    limiter = RateLimiter(requests_per_minute=600, burst=10)
+    start = time.monotonic()
+    for _ in range(10):
+        limiter.acquire()
+    assert time.monotonic() - start < 0.05
+    limiter.acquire()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.15
+
+
+def test_map_concurrently_keeps_the_order():
+    assert map_concurrently(lambda x: x * 2, range(20), max_workers=4) == [x * 2 for x in range(20)]
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from resume_index import ResumeIndex, find_jd_name
+
+TITLES = ["data_engineer", "data_scientist", "software_engineer", "product_manager"]
+
+
+def make_embeddings(count=2000, dim=32, clusters=20, seed=0):
+    # Resumes drawn around a few centres, like real embeddings, so the IVF lists are meaningful
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    vectors = centres[rng.integers(0, clusters, count)] + 0.3 * rng.standard_normal((count, dim))
+    return {f"{TITLES[i % len(TITLES)]}_resume_{i}": vector for i, vector in enumerate(vectors)}
+
+
+@pytest.fixture
+def index():
+    index = ResumeIndex.from_embeddings(make_embeddings())
+    index.train(nlist=16)
+    return index
+
+
+def queries(count=20):
+    # New points around the same centres, which are not in the index
+    return list(make_embeddings(2000 + count).values())[2000:]
+
+
+def test_ivf_scanning_every_list_matches_exact_search(index):
+    for query in queries():
+        exact = index.search(query, k=10, mode="exact")
+        ivf = index.search(query, k=10, mode="ivf", nprobe=16)
+        assert [key for key, _ in ivf] == [key for key, _ in exact]
+        np.testing.assert_allclose([score for _, score in ivf], [score for _, score in exact], rtol=1e-5)
+
+
+def test_ivf_recall(index):
+    report = index.evaluate(np.asarray(queries()), k=10, nprobe_values=(4,))
+    assert report[1]["recall"] >= 0.9
+
+
+def test_category_filter(index):
+    results = index.search(queries()[0], k=50, categories=["data_engineer"], mode="ivf", nprobe=16)
+    assert len(results) == 50
+    assert all(key.startswith("data_engineer_resume_") for key, _ in results)
+
+
+def test_sync_inserts_and_deletes_without_a_rebuild(index):
+    embeddings = make_embeddings()
+    removed = next(iter(embeddings))
+    del embeddings[removed]
+    changed = next(iter(embeddings))
+    embeddings[changed] = -embeddings[changed]
+    embeddings["data_engineer_resume_new"] = queries()[0]
+    assert index.sync(embeddings) == {"added": 1, "updated": 1, "removed": 1}
+    assert len(index) == len(embeddings)
+    assert index.search(queries()[0], k=1, mode="ivf", nprobe=16)[0][0] == "data_engineer_resume_new"
+    assert removed not in {key for key, _ in index.search(embeddings[changed], k=len(index), mode="exact")}
+    assert index.sync(embeddings) == {"added": 0, "updated": 0, "removed": 0}
+
+
+def test_save_and_load_drop_deleted_rows(index, tmp_path):
+    index.remove("data_engineer_resume_0")
+    index.save(str(tmp_path))
+    loaded = ResumeIndex.load(str(tmp_path))
+    assert len(loaded) == len(index)
+    for query in queries(5):
+        assert loaded.search(query, k=10, mode="ivf", nprobe=4) == index.search(query, k=10, mode="ivf", nprobe=4)
+
+
+def test_find_jd_name():
+    jd_names = ["jd_data\\de1_ola", "jd_data/ds1_swiggy"]
+    assert find_jd_name(jd_names, "de1_ola") == "jd_data\\de1_ola"
+    assert find_jd_name(jd_names, "jd_data/de1_ola") == "jd_data\\de1_ola"
+    assert find_jd_name(jd_names, "ds1_swiggy") == "jd_data/ds1_swiggy"
+    assert find_jd_name(jd_names, "pm1_zomato") is None
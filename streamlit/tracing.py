@@ -0,0 +1,233 @@
+# Description: Lightweight per-stage tracing for ingest, embedding, scoring and LLM calls.
+# Code wraps a stage in tracer.span(name, **attributes); the span times it, records an exception that escapes it and
+# keeps any attributes set on it (bytes, pages, token counts, cache hits, ...). Every finished span feeds a latency
+# histogram and attribute totals for its stage, and the most recent spans are kept for inspection. The data can be
+# exported as JSON or in the Prometheus text format, and profiled() dumps a cProfile of a single request.
+# Spans are per process: work done in the worker processes of DirectoryReader.read_files is only seen as a whole.
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets; the last bucket is unbounded
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Span:
+    """
+    One timed execution of a stage.
+    """
+    def __init__(self, name, attributes, parent=None):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.start = time.time()
+        self.perf_start = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.perf_start) * 1000
+
+    def set_error(self, error):
+        """
+        Records an error the stage handled itself, e.g. one turned into a message for the user.
+        """
+        self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+
+    def as_dict(self):
+        return {"name": self.name, "parent": self.parent, "start": self.start, "duration": self.duration,
+                "error": self.error, "attributes": self.attributes}
+
+
+class StageStats:
+    """
+    Aggregates of every finished span of one stage: a latency histogram, an error count and attribute totals.
+    """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.duration_sum = 0.0
+        self.totals = {}
+
+    def add(self, span):
+        self.count += 1
+        self.errors += span.error is not None
+        self.duration_sum += span.duration
+        self.bucket_counts[next((i for i, bound in enumerate(self.buckets) if span.duration <= bound),
+                                len(self.buckets))] += 1
+        for key, value in span.attributes.items():
+            # Integer attributes are counts and are totalled; bools count the spans they are True for, e.g. cache_hit.
+            # Floats, such as timings, are only kept on the span.
+            if isinstance(value, int):
+                self.totals[key] = self.totals.get(key, 0) + value
+
+    def quantile(self, q):
+        """
+        Estimates a latency quantile, in seconds, by interpolating within its histogram bucket.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if i == len(self.buckets):  # beyond the last bound, nothing better than the bound itself is known
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class Tracer:
+    """
+    Records spans and aggregates them per stage. It is safe to use from several threads at once.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_spans=500, enabled=True):
+        """
+        Args:
+            buckets (tuple): Upper bounds, in seconds, of the latency histogram buckets.
+            max_spans (int): Number of most recent spans kept.
+            enabled (bool): When False, spans are still yielded but nothing is recorded.
+        """
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.spans = deque(maxlen=max_spans)
+        self.local = threading.local()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Times the enclosed block as a span of the named stage.
+
+        Args:
+            name (str): Stage name, e.g. "extract_pdf".
+            **attributes: Initial span attributes. More can be added with span.set().
+
+        Yields:
+            Span: The span, to set attributes or a handled error on.
+        """
+        stack = self.local.__dict__.setdefault("stack", [])
+        current = Span(name, attributes, stack[-1].name if stack else None)
+        stack.append(current)
+        try:
+            yield current
+        except GeneratorExit:  # a consumer stopped reading a stream; not an error of the stage
+            current.set(cancelled=True)
+            raise
+        except Exception as e:
+            current.set_error(e)
+            raise
+        finally:
+            current.duration = time.perf_counter() - current.perf_start
+            stack.remove(current)  # not pop(): a span held open across a generator's yields may not be the last
+            self.record(current)
+
+    def record(self, span):
+        if not self.enabled:
+            return
+        with self.lock:
+            if span.name not in self.stages:
+                self.stages[span.name] = StageStats(self.buckets)
+            self.stages[span.name].add(span)
+            self.spans.append(span)
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.spans.clear()
+
+    def summary(self):
+        """
+        Returns a dictionary of stage name to its span count, error count, mean, p50 and p95 latency in ms, and
+        attribute totals, in order of total time spent.
+        """
+        with self.lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1].duration_sum)
+            return {name: {"count": stats.count, "errors": stats.errors,
+                           "total_ms": stats.duration_sum * 1000, "mean_ms": stats.duration_sum / stats.count * 1000,
+                           "p50_ms": stats.quantile(0.5) * 1000, "p95_ms": stats.quantile(0.95) * 1000,
+                           "totals": dict(stats.totals)}
+                    for name, stats in stages}
+
+    def recent_spans(self, limit=None):
+        with self.lock:
+            spans = list(self.spans)
+        return [span.as_dict() for span in spans[-limit if limit else 0:]]
+
+    def to_json(self, span_limit=100):
+        return json.dumps({"stages": self.summary(), "spans": self.recent_spans(span_limit)}, indent=2, default=str)
+
+    def to_prometheus(self, prefix="resume_analyser"):
+        """
+        Returns the stage histograms, error counts and attribute totals in the Prometheus text exposition format.
+        """
+        lines = [f"# HELP {prefix}_stage_duration_seconds Latency of each pipeline stage.",
+                 f"# TYPE {prefix}_stage_duration_seconds histogram"]
+        with self.lock:
+            stages = sorted(self.stages.items())
+            for name, stats in stages:
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), stats.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {stats.duration_sum}')
+                lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {stats.count}')
+            lines += [f"# HELP {prefix}_stage_errors_total Spans of each stage that ended in an error.",
+                      f"# TYPE {prefix}_stage_errors_total counter"]
+            lines += [f'{prefix}_stage_errors_total{{stage="{name}"}} {stats.errors}' for name, stats in stages]
+            lines += [f"# HELP {prefix}_stage_attribute_total Sum of a numeric span attribute, e.g. bytes or tokens.",
+                      f"# TYPE {prefix}_stage_attribute_total counter"]
+            lines += [f'{prefix}_stage_attribute_total{{stage="{name}",attribute="{key}"}} {float(value)}'
+                      for name, stats in stages for key, value in sorted(stats.totals.items())]
+        return "\n".join(lines) + "\n"
+
+
+# The process-wide tracer every module records into
+tracer = Tracer()
+
+
+@contextmanager
+def profiled(file_name, top=25):
+    """
+    Profiles the enclosed block with cProfile and dumps the stats to file_name (open it with pstats or snakeviz).
+
+    Only the calling thread is profiled: work handed to thread pools, such as concurrent LLM requests, shows up as
+    time spent waiting for it.
+
+    Yields:
+        io.StringIO: Filled on exit with the top functions by cumulative time.
+    """
+    summary = io.StringIO()
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield summary
+    finally:
+        profile.disable()
+        directory = os.path.dirname(file_name)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(file_name)
+        pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(top)
+
+
+def print_summary(summary=None):
+    for name, stage in (summary or tracer.summary()).items():
+        totals = ", ".join(f"{key}={value:g}" for key, value in stage["totals"].items())
+        print(f"{name}: {stage['count']} spans, {stage['errors']} errors, p50 {stage['p50_ms']:.1f} ms, "
+              f"p95 {stage['p95_ms']:.1f} ms, total {stage['total_ms'] / 1000:.1f} s"
+              + (f" ({totals})" if totals else ""))